@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for download_offline_packages.py against a local synthetic
+repository server, so downloader changes can be measured without depending on
+live upstreams.
+
+The server stands in for packages.axonops.com: it publishes apt indexes
+(Release + Packages.xz/.gz/plain) and a yum repository (repomd.xml +
+primary.xml.gz) with tens of thousands of entries, plus large blobs. Latency,
+per-connection throttling and mid-stream connection drops are configurable.
+Each scenario runs PackageDownloader in its own subprocess, so its peak RSS
+is measured in isolation.
+
+Usage:
+    # Default run; results written to benchmark_results.json
+    ./benchmark_downloader.py
+
+    # Compare with a stored run and fail on regressions
+    ./benchmark_downloader.py --baseline benchmark_results.json --output new.json
+
+    # Bigger indexes, slower network
+    ./benchmark_downloader.py --entries 50000 --latency 0.05 --rate 20M
+"""
+
+import os
+import sys
+import gzip
+import lzma
+import json
+import time
+import random
+import hashlib
+import argparse
+import platform
+import threading
+import subprocess
+import contextlib
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR))
+import download_offline_packages as dop  # noqa: E402
+
+DEFAULT_RESULTS = "benchmark_results.json"
+DEFAULT_TOLERANCE = 0.25
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+# Metrics compared against a baseline, and which direction is better.
+LOWER_IS_BETTER = ("seconds", "peak_rss_mb")
+HIGHER_IS_BETTER = ("throughput_mb_s",)
+# Timings this short are dominated by noise; they are never flagged.
+MIN_COMPARABLE_SECONDS = 0.2
+
+
+# ---------------------------------------------------------------------------
+# Synthetic repository
+# ---------------------------------------------------------------------------
+
+def build_repository(entries, blob_count, blob_size, seed=1):
+    """Return ``({path: bytes}, blobs)`` for a synthetic apt/yum repository.
+
+    ``entries`` packages are spread over the apt ``amd64``/``all``/``arm64``
+    indexes and the yum ``primary.xml.gz``; about 1% of them are ``axon-*``
+    packages the downloader will select. ``blobs`` is a list of
+    ``(path, sha256)`` for the large download targets.
+    """
+    rng = random.Random(seed)
+    files = {}
+
+    stanzas = {"amd64": [], "all": [], "arm64": []}
+    for i in range(entries):
+        arch = ("amd64", "amd64", "all", "arm64")[i % 4]
+        name = f"axon-synthetic{i % 97}-agent" if i % 100 == 0 else f"lib-synthetic-{i}"
+        version = f"{1 + i % 7}.{i % 13}.{i % 31}"
+        filename = f"pool/main/{name}_{version}_{arch}.deb"
+        stanzas[arch].append(
+            f"Package: {name}\n"
+            f"Version: {version}\n"
+            f"Architecture: {arch}\n"
+            f"Maintainer: Synthetic <noreply@example.com>\n"
+            f"Depends: libc6 (>= 2.17), adduser\n"
+            f"Filename: {filename}\n"
+            f"Size: {rng.randint(10_000, 50_000_000)}\n"
+            f"SHA256: {rng.randbytes(32).hex()}\n"
+            f"Description: synthetic package {i}\n"
+            f" Long description line one.\n"
+            f" .\n"
+            f" Long description line two.\n"
+        )
+
+    release = ["Origin: synthetic", "Suite: axonops-apt", "SHA256:"]
+    for arch, arch_stanzas in stanzas.items():
+        plain = "\n".join(arch_stanzas).encode()
+        index_dir = f"main/binary-{arch}"
+        for variant, data in (("Packages", plain),
+                              ("Packages.gz", gzip.compress(plain, mtime=0)),
+                              ("Packages.xz", lzma.compress(plain))):
+            files[f"apt/dists/axonops-apt/{index_dir}/{variant}"] = data
+            release.append(f" {hashlib.sha256(data).hexdigest()} {len(data)} {index_dir}/{variant}")
+    files["apt/dists/axonops-apt/Release"] = ("\n".join(release) + "\n").encode()
+
+    packages = []
+    for i in range(entries):
+        name = f"axon-synthetic{i % 97}-agent" if i % 100 == 0 else f"lib-synthetic-{i}"
+        arch = ("x86_64", "aarch64", "noarch")[i % 3]
+        ver, rel = f"{1 + i % 7}.{i % 13}.{i % 31}", "1"
+        packages.append(
+            f'<package type="rpm"><name>{name}</name><arch>{arch}</arch>'
+            f'<version epoch="0" ver="{ver}" rel="{rel}"/>'
+            f'<checksum type="sha256" pkgid="YES">{rng.randbytes(32).hex()}</checksum>'
+            f'<summary>synthetic package {i}</summary>'
+            f'<description>Synthetic package {i} for benchmarking.</description>'
+            f'<packager>Synthetic</packager><url>https://example.com/</url>'
+            f'<time file="1700000000" build="1700000000"/>'
+            f'<size package="{rng.randint(10_000, 50_000_000)}" installed="1" archive="1"/>'
+            f'<location href="Packages/{name}-{ver}-{rel}.{arch}.rpm"/>'
+            f'<format><rpm:license>Proprietary</rpm:license>'
+            f'<rpm:requires><rpm:entry name="glibc"/><rpm:entry name="/bin/sh"/></rpm:requires>'
+            f'</format></package>'
+        )
+    primary = gzip.compress((
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<metadata xmlns="{dop.RPM_COMMON_NS}" xmlns:rpm="{dop.RPM_NS}" packages="{entries}">'
+        + "".join(packages) + "</metadata>"
+    ).encode(), mtime=0)
+    primary_sha = hashlib.sha256(primary).hexdigest()
+    files[f"yum/repodata/{primary_sha}-primary.xml.gz"] = primary
+    files["yum/repodata/repomd.xml"] = (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n<repomd xmlns="{dop.RPM_REPO_NS}">'
+        f'<data type="primary"><checksum type="sha256">{primary_sha}</checksum>'
+        f'<location href="repodata/{primary_sha}-primary.xml.gz"/></data></repomd>'
+    ).encode()
+
+    blobs = []
+    for i in range(blob_count):
+        data = rng.randbytes(blob_size)
+        path = f"blobs/blob-{i}.tar.gz"
+        files[path] = data
+        blobs.append((path, hashlib.sha256(data).hexdigest()))
+    return files, blobs
+
+
+class SyntheticServer(ThreadingHTTPServer):
+    """In-memory HTTP server with latency, throttling and scripted drops.
+
+    ``latency`` seconds are slept before every response header, ``rate``
+    caps each response body in bytes/second, and a blob is cut off half way
+    through for its first ``drops`` requests. Per-path counters of requests,
+    ranged (resumed) requests, drops and body bytes are kept in ``stats``.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, files):
+        self.files = files
+        self.latency = 0.0
+        self.rate = 0
+        self.drops = 0
+        self.stats = {}
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), SyntheticRequestHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def configure(self, latency=0.0, rate=0, drops=0):
+        with self.lock:
+            self.latency, self.rate, self.drops = latency, rate, drops
+            self.stats = {}
+
+    def count(self, path, **increments):
+        with self.lock:
+            stats = self.stats.setdefault(path, {"requests": 0, "ranged": 0, "drops": 0, "bytes": 0})
+            for key, value in increments.items():
+                stats[key] += value
+            return stats
+
+    def totals(self):
+        with self.lock:
+            totals = {"requests": 0, "ranged": 0, "drops": 0, "bytes": 0}
+            for stats in self.stats.values():
+                for key in totals:
+                    totals[key] += stats[key]
+            return totals
+
+
+class SyntheticRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split("?", 1)[0].lstrip("/")
+        data = server.files.get(path)
+        time.sleep(server.latency)
+        if data is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        etag = f'"{hashlib.sha1(path.encode()).hexdigest()}"'
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", etag) == etag:
+            start = int(range_header.split("=", 1)[1].split("-", 1)[0])
+        stats = server.count(path, requests=1, ranged=1 if start else 0)
+        drop = path.startswith("blobs/") and stats["requests"] <= server.drops
+
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.end_headers()
+
+        view = memoryview(data)[start:]
+        if drop:
+            view = view[:len(view) // 2]
+        chunk = 256 * 1024
+        began = time.monotonic()
+        sent = 0
+        try:
+            for offset in range(0, len(view), chunk):
+                piece = view[offset:offset + chunk]
+                self.wfile.write(piece)
+                sent += len(piece)
+                if server.rate:
+                    ahead = sent / server.rate - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        server.count(path, bytes=sent, drops=1 if drop else 0)
+        if drop:
+            self.close_connection = True
+
+
+# ---------------------------------------------------------------------------
+# Scenarios (each runs in a worker subprocess)
+# ---------------------------------------------------------------------------
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable.
+
+    Linux keeps ``ru_maxrss`` across fork/exec, so a worker would inherit the
+    benchmark parent's peak (which holds the whole synthetic repository);
+    ``VmHWM`` from /proc is per address space and is preferred.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_worker(spec):
+    """Run one scenario in this process and return its metrics."""
+    upstreams = {
+        "axonops_apt": f"{spec['server']}/apt",
+        "axonops_yum": f"{spec['server']}/yum",
+    }
+    downloader = dop.PackageDownloader(spec["output_dir"], jobs=spec["jobs"], upstreams=upstreams)
+    scenario = spec["scenario"]
+    metrics = {}
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        if scenario in ("apt-index", "apt-index-cached"):
+            downloader.download_axonops("deb")
+        elif scenario in ("yum-index", "yum-index-cached"):
+            downloader.download_axonops("rpm")
+        else:
+            for path, sha256 in spec["blobs"]:
+                url = f"{spec['server']}/{path}"
+                downloader.enqueue(path, url, downloader.download_file, url,
+                                   Path(spec["output_dir"]) / os.path.basename(path), sha256)
+            downloader.run_downloads()
+        metrics["seconds"] = round(time.perf_counter() - started, 3)
+
+    if scenario.endswith(("-index", "-index-cached")):
+        metrics["packages_resolved"] = len(downloader.scheduler)
+    else:
+        failures = [label for label, error in downloader.results if error is not None]
+        metrics["failed"] = len(failures)
+        total = sum(os.path.getsize(Path(spec["output_dir"]) / os.path.basename(p)) for p, _ in spec["blobs"]
+                    if (Path(spec["output_dir"]) / os.path.basename(p)).exists())
+        metrics["throughput_mb_s"] = round(total / (1024 * 1024) / max(metrics["seconds"], 1e-6), 1)
+    downloader.http.close()
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    return metrics
+
+
+def run_scenario(server, name, spec, latency, rate, drops):
+    """Configure the server, run ``name`` in a subprocess and collect its metrics."""
+    server.configure(latency=latency, rate=rate, drops=drops)
+    spec = dict(spec, scenario=name)
+    proc = subprocess.run([sys.executable, __file__, "--worker", json.dumps(spec)],
+                          capture_output=True, text=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"scenario {name} failed:\n{proc.stdout}\n{proc.stderr}")
+    metrics = json.loads(lines[-1][len(RESULT_PREFIX):])
+    totals = server.totals()
+    metrics.update({
+        "requests": totals["requests"],
+        "resumed_requests": totals["ranged"],
+        "dropped_connections": totals["drops"],
+        "retries": totals["requests"] - len(server.stats),
+        "bytes_served": totals["bytes"],
+    })
+    return metrics
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages for ``results`` against ``baseline``."""
+    regressions = []
+    for name, metrics in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for key in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            new, old = metrics.get(key), previous.get(key)
+            if new is None or not old:
+                continue
+            if key == "seconds" and max(new, old) < MIN_COMPARABLE_SECONDS:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if key in LOWER_IS_BETTER else -change > tolerance
+            if worse:
+                regressions.append(f"{name}: {key} {old} → {new} ({change:+.0%})")
+    return regressions
+
+
+def print_table(results):
+    columns = ("seconds", "throughput_mb_s", "peak_rss_mb", "packages_resolved",
+               "requests", "retries", "resumed_requests", "dropped_connections")
+    print(f"\n{'scenario':<20}" + "".join(f"{c:>20}" for c in columns))
+    for name, metrics in results["scenarios"].items():
+        cells = ["" if metrics.get(c) is None else str(metrics[c]) for c in columns]
+        print(f"{name:<20}" + "".join(f"{cell:>20}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark download_offline_packages.py against a local synthetic repository")
+    parser.add_argument("--entries", type=int, default=20000, help="Packages per synthetic index (default: 20000)")
+    parser.add_argument("--blobs", type=int, default=4, help="Number of large blobs to download (default: 4)")
+    parser.add_argument("--blob-size", type=dop.parse_size, default="32M", metavar="SIZE",
+                        help="Size of each blob (default: 32M)")
+    parser.add_argument("--jobs", "-j", type=int, default=4, help="Downloader --jobs for blob scenarios (default: 4)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds before every response (default: 0.02)")
+    parser.add_argument("--rate", type=dop.parse_size, default=0, metavar="RATE",
+                        help="Per-connection throttle in bytes/second, e.g. 20M (default: unthrottled)")
+    parser.add_argument("--drops", type=int, default=1,
+                        help="Mid-stream drops per blob in the blobs-drops scenario (default: 1)")
+    parser.add_argument("--output", default=DEFAULT_RESULTS, help=f"Where to store results (default: {DEFAULT_RESULTS})")
+    parser.add_argument("--baseline", help="Results file to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Allowed relative slowdown before a metric counts as a regression (default: {DEFAULT_TOLERANCE})")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(RESULT_PREFIX + json.dumps(run_worker(json.loads(args.worker))))
+        return
+
+    print(f"Building synthetic repository ({args.entries} entries per index, "
+          f"{args.blobs} x {dop.format_size(args.blob_size)} blobs)...")
+    files, blobs = build_repository(args.entries, args.blobs, args.blob_size)
+    server = SyntheticServer(files)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = {
+        "date": dop.utc_now(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {key: getattr(args, key) for key in
+                       ("entries", "blobs", "blob_size", "jobs", "latency", "rate", "drops")},
+        "scenarios": {},
+    }
+    scenarios = [
+        # (name, fresh output dir, drops)
+        ("apt-index", True, 0),
+        ("apt-index-cached", False, 0),
+        ("yum-index", True, 0),
+        ("yum-index-cached", False, 0),
+        ("blobs", True, 0),
+        ("blobs-drops", True, args.drops),
+    ]
+    with tempfile.TemporaryDirectory(prefix="axonops-bench-") as workdir:
+        output_dir = None
+        for name, fresh, drops in scenarios:
+            if fresh or output_dir is None:
+                output_dir = tempfile.mkdtemp(dir=workdir)
+            spec = {"server": server.url, "output_dir": output_dir, "jobs": args.jobs, "blobs": blobs}
+            print(f"  running {name}...")
+            results["scenarios"][name] = run_scenario(server, name, spec, args.latency, args.rate, drops)
+    server.shutdown()
+
+    print_table(results)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"\n✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,10 @@ Usage:
 
 import os
 import sys
+import io
+import base64
+import ssl
+import http.client
 import urllib.request
 import urllib.error
 import hashlib
@@ -24,19 +28,48 @@ import json
 import argparse
 import re
 import gzip
-import shutil
+import lzma
 import fnmatch
+import shutil
+import struct
+import tarfile
+import posixpath
 import xml.etree.ElementTree as ET
 import time
+import random
+import threading
+import bisect
+from itertools import count
+from functools import lru_cache, partial
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from pathlib import Path
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit, quote, unquote
 from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.utils import formatdate
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, the atomic rename still applies
+    fcntl = None
 
 # Configuration
 SCRIPT_DIR = Path(__file__).parent
 DOWNLOAD_DIR = SCRIPT_DIR.parent / "offline_packages"
 USER_AGENT = "AxonOps-Chef-Downloader/1.0"
 
+# Upstream endpoints, in one place so PackageDownloader(upstreams=...) can
+# point a run at a local stand-in (see benchmark_downloader.py) instead.
+UPSTREAMS = {
+    "axonops_apt": "https://packages.axonops.com/apt",
+    "axonops_yum": "https://packages.axonops.com/yum",
+    "cassandra": "https://archive.apache.org/dist/cassandra/",
+    "elasticsearch": "https://artifacts.elastic.co/downloads/elasticsearch/",
+    "elasticsearch_releases": "https://api.github.com/repos/elastic/elasticsearch/releases?per_page=50",
+    "zulu_api": "https://api.azul.com/zulu/download/community/v1.0/bundles/latest/",
+}
+
 # Cassandra versions to offer
 CASSANDRA_VERSIONS = {
     "5.0": ["5.0.4", "5.0.3", "5.0.2", "5.0.1", "5.0.0"],
@@ -64,6 +97,17 @@ JAVA_DISTRIBUTIONS = {
     }
 }
 
+# Platform matrix (--platforms). Keys are Elasticsearch's tarball platform
+# suffixes; "java_arch" is the matching Zulu JDK build (the JDK is only
+# mirrored for Linux, where the cookbook installs it).
+PLATFORMS = {
+    "linux-x86_64": {"name": "Linux x64", "java_arch": "x64"},
+    "linux-aarch64": {"name": "Linux ARM64", "java_arch": "aarch64"},
+    "darwin-x86_64": {"name": "macOS x64", "java_arch": None},
+    "darwin-aarch64": {"name": "macOS ARM64", "java_arch": None},
+}
+DEFAULT_PLATFORM = "linux-x86_64"
+
 # AxonOps package selection.
 #
 # The exact package names drift (dotted series, JDK-variant suffixes, new
@@ -77,65 +121,1887 @@ AXONOPS_PACKAGE_PREFIX = "axon-"
 
 # apt repository layout (verified against packages.axonops.com/apt):
 #   suite/codename: axonops-apt   component: main   architectures: all amd64 arm64
-# The per-arch index is served as a plain (uncompressed) "Packages" file — there
-# is no "Packages.gz".
+# The per-arch index is currently served as a plain (uncompressed) "Packages"
+# file only. The suite's Release file is consulted first, and a compressed
+# variant is preferred whenever Release lists one.
 AXONOPS_APT_SUITE = "axonops-apt"
 AXONOPS_APT_COMPONENT = "main"
 AXONOPS_APT_ARCHITECTURES = ["all", "amd64", "arm64"]
+# Index variants in order of preference, with the matching stream decompressor.
+APT_INDEX_VARIANTS = [
+    ("Packages.xz", lzma.LZMAFile),
+    ("Packages.gz", lambda fileobj: gzip.GzipFile(fileobj=fileobj)),
+    ("Packages", None),
+]
+
+# In-progress downloads are written to "<name>.part" with a "<name>.part.json"
+# resume record next to them, and renamed into place once complete.
+PART_SUFFIX = ".part"
+PART_STATE_SUFFIX = ".part.json"
+
+# Bookkeeping the downloader keeps between runs lives in this hidden directory
+# inside the download directory, so it travels with the files it describes.
+STATE_DIR_NAME = ".axonops-downloader"
+# Bumped whenever the records cached from parsed apt/yum metadata change
+# shape, so package lists written by an older version are parsed again.
+PARSED_METADATA_FORMAT = 3
+
+# The manifest records a sha256 for every MERKLE_CHUNK_SIZE chunk of files
+# larger than one chunk, rolled up into a Merkle root, so --verify can name
+# the damaged chunks and --repair re-fetch only those byte ranges.
+MERKLE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Read/hash buffer size (--buffer-size). Large buffers keep per-call overhead
+# (syscalls, hash updates, Python loop iterations) negligible for GB tarballs.
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+# The progress bar is redrawn at most this often (seconds), however small the
+# reads, so a fast transfer costs a few terminal writes a second, not one per
+# buffer.
+PROGRESS_INTERVAL = 0.25
+
+
+# HTTP connection pooling. Every request made by the downloader goes through
+# one shared HTTPConnectionPool so TLS sessions to the same host are reused
+# (HTTP/1.1 keep-alive) instead of re-handshaking for each package, sidecar
+# and metadata file. archive.apache.org throttles aggressive clients, so it
+# gets fewer parallel connections than the CDNs. The same limits cap how many
+# queued downloads the TransferScheduler runs against each host at once
+# (override with --host-limit HOST=N).
+DEFAULT_CONNECTIONS_PER_HOST = 4
+HOST_CONNECTION_LIMITS = {
+    "packages.axonops.com": 4,
+    "archive.apache.org": 2,
+    "artifacts.elastic.co": 3,
+}
+HTTP_TIMEOUT = 60  # seconds without any data before a request is abandoned
+MAX_REDIRECTS = 10
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+class HashingReader(io.RawIOBase):
+    """Raw stream wrapper that hashes every byte read through it."""
+
+    def __init__(self, fileobj, algorithm='sha256'):
+        super().__init__()
+        self._fileobj = fileobj
+        self._hasher = hashlib.new(algorithm)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self._fileobj.readinto(buffer)
+        if n:
+            self._hasher.update(memoryview(buffer)[:n])
+        return n
+
+    def drain(self):
+        """Read (and hash) whatever is left, e.g. after a decompressor stops early."""
+        while self.read(DEFAULT_BUFFER_SIZE):
+            pass
+
+    def hexdigest(self):
+        return self._hasher.hexdigest()
+
+
+def merkle_root(hashes):
+    """Root of the binary sha256 Merkle tree over hex leaf ``hashes``.
+
+    Pairs are hashed as ``sha256(left + right)`` over the raw digests; an
+    odd node out is carried up to the next level unchanged.
+    """
+    level = [bytes.fromhex(digest) for digest in hashes]
+    while len(level) > 1:
+        level = [hashlib.sha256(b''.join(level[i:i + 2])).digest() if i + 1 < len(level) else level[i]
+                 for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+
+class ChunkHasher:
+    """sha256 of every fixed-size chunk of a stream, for the manifest's Merkle tree.
+
+    Offers hashlib's ``update()`` so it can be fed in the same read loop as
+    the whole-file digests. A file no larger than one chunk has a single
+    leaf, which equals the file's sha256.
+    """
+
+    def __init__(self, chunk_size=MERKLE_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.hashes = []
+        self._current = hashlib.sha256()
+        self._filled = 0
+
+    def update(self, data):
+        data = memoryview(data)
+        while len(data):
+            n = min(len(data), self.chunk_size - self._filled)
+            self._current.update(data[:n])
+            self._filled += n
+            data = data[n:]
+            if self._filled == self.chunk_size:
+                self.hashes.append(self._current.hexdigest())
+                self._current = hashlib.sha256()
+                self._filled = 0
+
+    def tree(self):
+        """Return ``{chunk_size, root, hashes}`` for everything fed so far."""
+        hashes = list(self.hashes)
+        if self._filled or not hashes:
+            hashes.append(self._current.hexdigest())
+        return {'chunk_size': self.chunk_size, 'root': merkle_root(hashes), 'hashes': hashes}
+
+
+class TokenBucket:
+    """Thread-safe token bucket capping throughput at ``rate`` bytes/second.
+
+    Callers report bytes after reading them; a caller that overdraws the
+    bucket sleeps until the debt is repaid, which spreads a global cap
+    across however many transfers are running.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= nbytes
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class PooledResponse:
+    """A response that hands its connection back to the pool when closed.
+
+    Mirrors the parts of urllib's response object the downloader uses
+    (``status``, ``headers``, ``read``, ``readinto``, ``geturl`` and the
+    context-manager protocol). The connection is only reused if the body was
+    read to the end and the server did not ask to close it.
+    """
+
+    def __init__(self, pool, key, conn, response, url):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    def read(self, amt=None):
+        data = self._response.read(amt)
+        self._pool.throttle(len(data))
+        return data
+
+    def readinto(self, buffer):
+        n = self._response.readinto(buffer)
+        self._pool.throttle(n)
+        return n
+
+    def geturl(self):
+        return self.url
+
+    def close(self):
+        if self._conn is None:
+            return
+        response = self._response
+        if not response.isclosed() and response.length == 0:
+            response.read()  # finalises empty (HEAD/304) bodies
+        reusable = response.isclosed() and not response.will_close
+        if not reusable:
+            response.close()
+            self._conn.close()
+        self._pool._release(self._key, self._conn if reusable else None)
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HTTPConnectionPool:
+    """Per-host pool of keep-alive HTTP(S) connections.
+
+    ``urlopen`` is a drop-in for the subset of ``urllib.request.urlopen`` the
+    downloader needs: it takes a URL or ``urllib.request.Request``, follows
+    redirects, honours the standard ``*_proxy``/``no_proxy`` environment
+    variables and raises ``urllib.error.HTTPError`` for 4xx/5xx responses.
+    At most ``max_per_host`` requests to one host are in flight at a time;
+    further callers wait for a connection to be handed back. Response bodies
+    are metered through ``rate_limiter`` (a TokenBucket), if given.
+    """
+
+    def __init__(self, max_per_host=DEFAULT_CONNECTIONS_PER_HOST, host_limits=None, timeout=HTTP_TIMEOUT,
+                 rate_limiter=None):
+        self.max_per_host = max_per_host
+        self.host_limits = dict(HOST_CONNECTION_LIMITS if host_limits is None else host_limits)
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._slots = {}
+        self._ssl_context = ssl.create_default_context()
+        self._proxies = urllib.request.getproxies()
+
+    def urlopen(self, request, timeout=None):
+        if isinstance(request, str):
+            request = urllib.request.Request(request)
+        url = request.full_url
+        method = request.get_method()
+        data = request.data
+        headers = {name.title(): value for name, value in request.header_items()}
+        headers.setdefault('User-Agent', USER_AGENT)
+        timeout = self.timeout if timeout is None else timeout
+
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._send(url, method, headers, data, timeout)
+            if response.status in REDIRECT_CODES and response.headers.get('Location'):
+                response.read()
+                response.close()
+                url = urljoin(url, response.headers['Location'])
+                if response.status == 303:
+                    method, data = 'GET', None
+                continue
+            if response.status >= 400:
+                body = response.read()
+                response.close()
+                raise urllib.error.HTTPError(url, response.status, response.reason,
+                                             response.headers, io.BytesIO(body))
+            return response
+        raise urllib.error.URLError(f"too many redirects fetching {request.full_url}")
+
+    def throttle(self, nbytes):
+        """Account ``nbytes`` of response body against the bandwidth cap."""
+        if self.rate_limiter and nbytes:
+            self.rate_limiter.consume(nbytes)
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _send(self, url, method, headers, data, timeout):
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ('http', 'https'):
+            raise urllib.error.URLError(f"unsupported URL scheme: {url}")
+        host = parts.hostname
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, host, port)
+        proxy = self._proxy_for(scheme, host)
+        # Plain-HTTP requests through a proxy carry the absolute URL; HTTPS
+        # goes through a CONNECT tunnel and looks like a direct request.
+        if proxy and scheme == 'http':
+            target = url
+            headers = dict(headers, **self._proxy_address(proxy)[2])
+        else:
+            target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+
+        slot = self._slot(key)
+        slot.acquire()
+        try:
+            while True:
+                conn, reused = self._checkout(key, proxy, timeout)
+                try:
+                    conn.request(method, target, body=data, headers=headers)
+                    response = conn.getresponse()
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    conn.close()
+                    if reused:
+                        # The server timed out the idle keep-alive connection
+                        # before we reused it; retry once on a fresh one.
+                        continue
+                    raise
+                except Exception:
+                    conn.close()
+                    raise
+                return PooledResponse(self, key, conn, response, url)
+        except Exception:
+            slot.release()
+            raise
+
+    def _slot(self, key):
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                limit = self.host_limits.get(key[1], self.max_per_host)
+                slot = self._slots[key] = threading.BoundedSemaphore(max(1, limit))
+            return slot
+
+    def _checkout(self, key, proxy, timeout):
+        """Return ``(connection, reused)`` for ``key``; caller holds its slot."""
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        scheme, host, port = key
+        if proxy:
+            connect_host, connect_port, proxy_headers = self._proxy_address(proxy)
+        else:
+            connect_host, connect_port = host, port
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(connect_host, connect_port, timeout=timeout,
+                                               context=self._ssl_context)
+            if proxy:
+                conn.set_tunnel(host, port, headers=proxy_headers)
+        else:
+            conn = http.client.HTTPConnection(connect_host, connect_port, timeout=timeout)
+        return conn, False
+
+    def _release(self, key, conn):
+        if conn is not None:
+            with self._lock:
+                self._idle.setdefault(key, []).append(conn)
+        self._slot(key).release()
+
+    def _proxy_for(self, scheme, host):
+        proxy = self._proxies.get(scheme)
+        if not proxy or urllib.request.proxy_bypass(host):
+            return None
+        return proxy
+
+    def _proxy_address(self, proxy):
+        """Split a proxy URL into ``(host, port, auth_headers)``."""
+        parts = urlsplit(proxy if '://' in proxy else f"http://{proxy}")
+        headers = {}
+        if parts.username:
+            credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+            headers['Proxy-Authorization'] = 'Basic ' + base64.b64encode(credentials.encode()).decode()
+        return parts.hostname, parts.port or 8080, headers
+
+
+# Version discovery cache. Entries live for VERSION_CACHE_TTL seconds unless the
+# key (or a key prefix ending in "_") has its own TTL below: Apache and Elastic
+# publish releases weeks apart, so their lists can be kept longer than the Zulu
+# "latest" pointer.
+VERSION_CACHE_TTL = 3600  # 1 hour
+VERSION_CACHE_TTLS = {
+    "cassandra_versions": 6 * 3600,
+    "elasticsearch_versions": 6 * 3600,
+    "zulu_java_17_": 3600,
+}
+
+
+# Upstream version discovery runs concurrently before any download starts.
+# Each endpoint gets its own budget (seconds); one that has not answered in time
+# is abandoned in favour of the cached or built-in versions, so discovery
+# takes as long as the slowest endpoint and never longer than its budget.
+DISCOVERY_TIMEOUTS = {
+    "cassandra": 20,      # archive.apache.org directory listing (rate-limited)
+    "elasticsearch": 10,  # GitHub releases API
+    "java": 10,           # Azul metadata API
+}
+
+# Checksum sidecars ("<artifact>.sha512" etc.) are requested concurrently, each
+# with this timeout (seconds), and the strongest one published wins. Release
+# artifacts never change, so resolved digests are cached by artifact URL in
+# <state dir>/checksums.json and later runs skip the sidecar requests.
+SIDECAR_TIMEOUT = 15
+CHECKSUM_STRENGTH = ("sha512", "sha256", "sha1")
+
+
+class VersionCache:
+    """Process-wide view of ``version_cache.json``.
+
+    The file is read once, on first use, and served from memory afterwards.
+    Writes merge into whatever is on disk under an exclusive ``flock`` on a
+    sibling ``.lock`` file and replace the file atomically, so concurrent
+    runs never see (or produce) a half-written cache.
+    """
+
+    def __init__(self, path, default_ttl=VERSION_CACHE_TTL, ttls=None):
+        self.path = Path(path)
+        self.default_ttl = default_ttl
+        self.ttls = dict(VERSION_CACHE_TTLS if ttls is None else ttls)
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def ttl(self, key):
+        """Return the TTL in seconds for ``key``."""
+        if key in self.ttls:
+            return self.ttls[key]
+        for prefix, ttl in self.ttls.items():
+            if prefix.endswith('_') and key.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key):
+        """Return ``(data, fresh)``; ``(None, False)`` if ``key`` was never cached."""
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            entry = self._entries.get(key)
+        if not entry or 'data' not in entry:
+            return None, False
+        fresh = time.time() - entry.get('timestamp', 0) < self.ttl(key)
+        return entry['data'], fresh
+
+    def validators(self, key):
+        """Return the ``{etag, last_modified}`` ``key`` was last fetched with."""
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            entry = self._entries.get(key) or {}
+        return {name: entry[name] for name in ('etag', 'last_modified') if entry.get(name)}
+
+    def set(self, key, data, validators=None):
+        """Store ``data`` under ``key`` in memory and on disk.
+
+        ``validators`` (``{etag, last_modified}``) are kept with it so the
+        endpoint can later be revalidated with a conditional request.
+        """
+        entry = {'timestamp': time.time(), 'data': data}
+        entry.update({name: value for name, value in (validators or {}).items() if value})
+        with self._lock:
+            # Merge with the file as it is now, not as it was when we loaded
+            # it, so keys written by another run are kept.
+            self._entries = update_json_locked(self.path, lambda entries: entries.__setitem__(key, entry),
+                                               indent=2)
+
+    def _read(self):
+        entries = read_json(self.path)
+        return entries if isinstance(entries, dict) else {}
+
+
+def read_json(path):
+    """Return the JSON document at ``path``, or None if missing/corrupt."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def update_json_locked(path, update, indent=None):
+    """Apply ``update(data)`` to the JSON object at ``path``, safely across processes.
+
+    The read-modify-write happens under an exclusive ``flock`` on a sibling
+    ``.lock`` file and the result replaces the file atomically, so concurrent
+    writers neither lose each other's keys nor leave a torn file behind.
+    Returns the updated object.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + '.lock'), 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        data = read_json(path)
+        if not isinstance(data, dict):
+            data = {}
+        update(data)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    return data
+
+
+# Linux ioctl that makes a copy-on-write clone of a file (btrfs, XFS, ...).
+FICLONE = 0x40049409
+
+
+def link_or_clone(src, dest):
+    """Make ``dest`` share ``src``'s data without copying it where possible.
+
+    Tries a hardlink first, then a reflink (copy-on-write clone) for stores
+    on another filesystem that supports it, and finally a plain copy. The
+    new file is moved into place atomically.
+    """
+    src, dest = Path(src), Path(dest)
+    tmp_path = dest.with_name(f".{dest.name}.{os.getpid()}.{threading.get_ident()}.link")
+    if tmp_path.exists():
+        os.remove(tmp_path)
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        with open(src, 'rb') as f_in, open(tmp_path, 'wb') as f_out:
+            try:
+                if not fcntl:
+                    raise OSError("reflinks need fcntl")
+                fcntl.ioctl(f_out.fileno(), FICLONE, f_in.fileno())
+            except OSError:
+                shutil.copyfileobj(f_in, f_out, DEFAULT_BUFFER_SIZE)
+    os.replace(tmp_path, dest)
+
+
+class ArtifactStore:
+    """Content-addressed store of downloaded artifacts, shared by output trees.
+
+    Objects live at ``objects/sha256/<ab>/<digest>``. ``index.json`` maps
+    other ways of naming the same content — the artifact URL, or a sha512/
+    sha1 published upstream — to its sha256, so an artifact is recognised
+    before it is fetched even when no sha256 is known for it. Next to each
+    URL alias it keeps the ETag/Last-Modified the content was fetched with,
+    so trees that link it can still revalidate it conditionally. Output
+    directories receive hardlinks (or reflinks/copies across filesystems),
+    so disk use grows with unique content rather than with the number of
+    trees.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root).expanduser()
+        (self.root / 'objects' / 'sha256').mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / 'index.json'
+        self._lock = threading.Lock()
+        self._index = None
+
+    def object_path(self, sha256):
+        sha256 = sha256.lower()
+        return self.root / 'objects' / 'sha256' / sha256[:2] / sha256
+
+    def resolve(self, url=None, algorithm=None, digest=None):
+        """Return the sha256 of stored content matching ``digest`` or ``url``.
+
+        ``url`` is only consulted when no digest is known, i.e. for artifacts
+        whose upstream publishes no checksum.
+        """
+        if digest and algorithm == 'sha256':
+            sha256 = digest.lower()
+        else:
+            with self._lock:
+                if self._index is None:
+                    self._index = read_json(self.index_path) or {}
+                index = self._index
+            sha256 = None
+            if digest and algorithm:
+                sha256 = index.get(f"{algorithm}:{digest.lower()}")
+            if sha256 is None and url and not digest:
+                sha256 = index.get(f"url:{url}")
+        if sha256 and self.object_path(sha256).exists():
+            return sha256
+        return None
+
+    def source(self, url, sha256):
+        """Return the ``{url, etag, last_modified, size}`` ``sha256`` was fetched from ``url`` with."""
+        with self._lock:
+            if self._index is None:
+                self._index = read_json(self.index_path) or {}
+            source = self._index.get(f"source:{url}")
+        if not isinstance(source, dict) or source.get('sha256') != sha256:
+            return None
+        return {key: value for key, value in source.items() if key != 'sha256'}
+
+    def materialize(self, sha256, dest):
+        """Link the stored object ``sha256`` to ``dest``."""
+        obj = self.object_path(sha256)
+        dest = Path(dest)
+        try:
+            if dest.exists() and os.path.samefile(obj, dest):
+                return
+        except OSError:
+            pass
+        link_or_clone(obj, dest)
+
+    def ingest(self, path, digests, url=None, source=None):
+        """Add the file at ``path`` to the store under ``digests['sha256']``.
+
+        ``source`` is the ``{url, etag, last_modified, size}`` the file was
+        downloaded with; it is kept alongside the ``url`` alias.
+        """
+        sha256 = digests['sha256'].lower()
+        obj = self.object_path(sha256)
+        if not obj.exists():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            link_or_clone(path, obj)
+        aliases = {f"{algorithm}:{digest.lower()}": sha256
+                   for algorithm, digest in digests.items() if algorithm != 'sha256'}
+        if url:
+            aliases[f"url:{url}"] = sha256
+            if source:
+                aliases[f"source:{url}"] = dict(source, sha256=sha256)
+        if aliases:
+            with self._lock:
+                self._index = update_json_locked(self.index_path, lambda index: index.update(aliases))
+
+
+def utc_now():
+    """Current time as an ISO-8601 UTC timestamp."""
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def format_size(nbytes):
+    """Human-readable byte count, e.g. ``412.3 MB``."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(nbytes) < 1024 or unit == 'GB':
+            return f"{nbytes:.0f} {unit}" if unit == 'B' else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+
+# Character weights for dpkg's verrevcmp(): '~' sorts before everything,
+# even the end of the string, and letters sort before other punctuation.
+def _dpkg_order(char):
+    if char == '~':
+        return -1
+    if char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+
+_DPKG_SEGMENT = re.compile(r'(\D*)(\d*)')
+
+
+def _dpkg_segments(part):
+    """Encode an upstream version or revision for plain tuple comparison.
+
+    The string becomes alternating (non-digit weights, number) pairs. Each
+    non-digit run ends in a 0 weight and the sequence ends in ``(0,)``, so a
+    string that runs out compares exactly like dpkg's "end of string".
+    """
+    segments = []
+    pos = 0
+    while True:
+        match = _DPKG_SEGMENT.match(part, pos)
+        segments.append(tuple(_dpkg_order(c) for c in match.group(1)) + (0,))
+        segments.append(int(match.group(2) or 0))
+        pos = match.end()
+        if pos >= len(part):
+            break
+    segments.append((0,))
+    return tuple(segments)
+
+
+# Token ranks for rpmvercmp(): '~' sorts before the end of the string, '^'
+# after it but before any further segment, and numbers beat letters.
+_RPM_TILDE, _RPM_END, _RPM_CARET, _RPM_ALPHA, _RPM_NUMERIC = range(5)
+_RPM_SEGMENT = re.compile(r'(~)|(\^)|(\d+)|([a-zA-Z]+)')
+
+
+def _rpm_segments(part):
+    """Encode a version or release as rpmvercmp() tokens."""
+    tokens = []
+    for tilde, caret, digits, letters in _RPM_SEGMENT.findall(part):
+        if tilde:
+            tokens.append((_RPM_TILDE,))
+        elif caret:
+            tokens.append((_RPM_CARET,))
+        elif digits:
+            tokens.append((_RPM_NUMERIC, int(digits)))
+        else:
+            tokens.append((_RPM_ALPHA, letters))
+    tokens.append((_RPM_END,))
+    return tuple(tokens)
+
+
+def _split_evr(version, revision_sep):
+    """Split ``[epoch:]version[-revision]`` into its three parts."""
+    epoch, sep, rest = version.partition(':')
+    if not sep or not epoch.isdigit():
+        epoch, rest = '0', version
+    upstream, sep, revision = rest.rpartition(revision_sep)
+    if not sep:
+        upstream, revision = rest, ''
+    return int(epoch), upstream, revision
+
+
+class VersionKey:
+    """A version string parsed once into a key that sorts like the package manager.
+
+    ``scheme`` is ``deb`` for dpkg ordering (epoch, then upstream version and
+    Debian revision compared with verrevcmp, so ``1.0~rc1 < 1.0``) or ``rpm``
+    for rpmvercmp ordering (epoch, version, release; ``~`` and ``^``
+    honoured, separators ignored, numbers newer than letters). Tarball
+    versions use ``rpm``, which ranks ``4.0-beta4`` below ``4.0.0``.
+    Comparisons are plain tuple comparisons and never raise on mixed
+    numeric/alphabetic parts. Build keys with :func:`version_key` so each
+    distinct string is only parsed once.
+    """
+
+    __slots__ = ('version', 'scheme', 'key')
+
+    def __init__(self, version, scheme='rpm'):
+        self.version = version
+        self.scheme = scheme
+        if scheme == 'deb':
+            epoch, upstream, revision = _split_evr(version, '-')
+            self.key = (epoch, _dpkg_segments(upstream), _dpkg_segments(revision))
+        elif scheme == 'rpm':
+            epoch, upstream, release = _split_evr(version, '-')
+            self.key = (epoch, _rpm_segments(upstream), _rpm_segments(release))
+        else:
+            raise ValueError(f"unknown version scheme: {scheme!r}")
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def __le__(self, other):
+        return self.key <= other.key
+
+    def __gt__(self, other):
+        return self.key > other.key
+
+    def __ge__(self, other):
+        return self.key >= other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"VersionKey({self.version!r}, {self.scheme!r})"
+
+
+@lru_cache(maxsize=16384)
+def version_key(version, scheme='rpm'):
+    """Memoized :class:`VersionKey` for ``version`` under ``scheme``."""
+    return VersionKey(version, scheme)
+
+
+def artifact_version_key(name, version):
+    """Version key for a downloaded file: dpkg ordering for ``.deb``, rpm otherwise."""
+    return version_key(version, 'deb' if name.endswith('.deb') else 'rpm')
+
+
+# File name patterns of every artifact the downloader fetches. They give each
+# manifest entry its package/version/arch, and "series" separates release
+# lines (Cassandra 4.1 vs 5.0) that --prune must keep independently.
+ARTIFACT_PATTERNS = [
+    ('deb', re.compile(r'^(?P<package>[^_]+)_(?P<version>[^_]+)_(?P<arch>[^_]+)\.deb$')),
+    ('rpm', re.compile(r'^(?P<package>.+)-(?P<version>[^-]+-[^-]+)\.(?P<arch>[^.]+)\.rpm$')),
+    ('cassandra', re.compile(r'^(?P<package>apache-cassandra)-(?P<version>(?P<series>\d+\.\d+)\.[^-]+)-bin\.tar\.gz$')),
+    ('elasticsearch', re.compile(r'^(?P<package>elasticsearch)-(?P<version>(?P<series>\d+)\.[^-]+)-(?P<arch>.+)\.tar\.gz$')),
+    ('java', re.compile(r'^(?P<package>zulu)(?P<version>[\d.]+)-ca-jdk(?P<series>\d+)[^-]*-(?P<arch>.+)\.tar\.gz$')),
+]
+
+
+def artifact_identity(name):
+    """Return ``{package, version, arch, series}`` for a downloaded file name, or None."""
+    for _, pattern in ARTIFACT_PATTERNS:
+        match = pattern.match(name)
+        if match:
+            identity = {key: value for key, value in match.groupdict().items() if value}
+            identity['version'] = unquote(identity['version'])
+            return identity
+    return None
+
+
+def parse_size(value):
+    """Parse a byte count such as ``65536``, ``512K`` or ``4M``."""
+    match = re.match(r'^\s*(\d+)\s*([KMG]?)i?B?\s*$', str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"invalid size: {value!r}")
+    multiplier = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[match.group(2).upper()]
+    return int(match.group(1)) * multiplier
+
+
+class DigestIndex:
+    """Persistent record of file digests, validated by the file's stat().
+
+    Digests computed while a file streams in are stored here keyed by file
+    name, together with the size, mtime and inode they were computed for.
+    As long as those still match, later runs can trust the stored digest
+    instead of reading the whole file again. Downloaded files also keep the
+    URL, ETag, Last-Modified and size they were fetched with, so artifacts
+    without a published checksum can be revalidated with a conditional GET.
+    """
+
+    def __init__(self, path, root):
+        self.path = Path(path)
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self.path, 'r') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def _signature(stat):
+        return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+    def entry(self, file_path):
+        """Return the stored entry for ``file_path`` if the file is unchanged."""
+        file_path = Path(file_path)
+        with self._lock:
+            entry = self._entries.get(file_path.name)
+        if not entry:
+            return None
+        try:
+            if entry.get('stat') != self._signature(file_path.stat()):
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def lookup(self, file_path, algorithm='sha256'):
+        """Return the stored ``algorithm`` digest of ``file_path`` if still valid."""
+        entry = self.entry(file_path)
+        return entry.get('digests', {}).get(algorithm) if entry else None
+
+    def source(self, file_path, url):
+        """Return the upstream validators ``file_path`` was fetched from ``url`` with."""
+        entry = self.entry(file_path)
+        source = entry.get('source') if entry else None
+        return source if source and source.get('url') == url else None
+
+    def record(self, file_path, digests, downloaded_at=None, source=None):
+        """Remember ``digests`` (``{algorithm: hexdigest}``) for ``file_path``.
+
+        The ``chunks`` key holds the file's ChunkHasher tree instead of a
+        hex digest.
+
+        ``downloaded_at`` is the ISO-8601 time the file finished downloading
+        and ``source`` the ``{url, etag, last_modified, size}`` it came from;
+        both are kept for as long as the file itself is unchanged.
+        """
+        file_path = Path(file_path)
+        signature = self._signature(file_path.stat())
+        with self._lock:
+            entry = self._entries.get(file_path.name)
+            if not entry or entry.get('stat') != signature:
+                entry = {'stat': signature, 'digests': {}}
+                self._entries[file_path.name] = entry
+            entry['digests'].update(digests)
+            if downloaded_at:
+                entry['downloaded_at'] = downloaded_at
+            if source:
+                entry['source'] = source
+            self._dirty = True
+
+    def forget(self, file_path):
+        """Drop the stored entry for ``file_path``, e.g. once it is known to be damaged."""
+        with self._lock:
+            if self._entries.pop(Path(file_path).name, None) is not None:
+                self._dirty = True
+
+    def save(self):
+        """Write the index back to disk, forgetting files that no longer exist."""
+        with self._lock:
+            for name in [n for n in self._entries if not (self.root / n).exists()]:
+                del self._entries[name]
+                self._dirty = True
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+class TransferScheduler:
+    """Runs queued transfers largest first within per-host concurrency limits.
+
+    Tasks are ordered by size, then submission order; a task of unknown size
+    counts as large, as those are the multi-hundred-MB tarballs, so the long
+    transfers overlap the short ones. Each worker takes the first task whose
+    host is below its limit, so one throttled host never leaves the others
+    idle. A task that ends up fetching from another host (a mirror) moves
+    its slot there with :meth:`use_host`.
+    """
+
+    def __init__(self, workers, host_limits=None, default_limit=DEFAULT_CONNECTIONS_PER_HOST):
+        self.workers = workers
+        self.host_limits = dict(HOST_CONNECTION_LIMITS if host_limits is None else host_limits)
+        self.default_limit = default_limit
+        self._pending = []
+        self._active = {}
+        self._order = count()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, task, url, size=None):
+        """Queue ``task`` for a transfer from ``url`` of ``size`` bytes (if known)."""
+        key = (-size if size else float('-inf'), next(self._order))
+        with self._cond:
+            bisect.insort(self._pending, (key, urlsplit(url).hostname, task))
+
+    def run(self, func):
+        """Call ``func(task)`` for every queued task; return results as they complete."""
+        results = []
+
+        def worker():
+            while True:
+                item = self._next()
+                if item is None:
+                    return
+                self._local.host, task = item
+                try:
+                    results.append(func(task))
+                finally:
+                    with self._cond:
+                        self._active[self._local.host] -= 1
+                        self._local.host = None
+                        self._cond.notify_all()
+
+        workers = min(self.workers, len(self._pending))
+        if workers <= 1:
+            worker()
+            return results
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def use_host(self, url):
+        """Move the calling task's host slot to the host of ``url``.
+
+        Waits until that host is below its limit. Does nothing outside a
+        scheduled task, or when ``url`` is on the host already claimed.
+        """
+        host = urlsplit(url).hostname
+        current = getattr(self._local, 'host', None)
+        if current is None or host == current:
+            return
+        with self._cond:
+            self._active[current] -= 1
+            self._local.host = None
+            self._cond.notify_all()
+            while not self._has_slot(host):
+                self._cond.wait()
+            self._active[host] = self._active.get(host, 0) + 1
+            self._local.host = host
+
+    def _has_slot(self, host):
+        return self._active.get(host, 0) < self.host_limits.get(host, self.default_limit)
+
+    def _next(self):
+        """Claim the first queued task whose host has a free slot."""
+        with self._cond:
+            while self._pending:
+                for i, (_, host, task) in enumerate(self._pending):
+                    if self._has_slot(host):
+                        del self._pending[i]
+                        self._active[host] = self._active.get(host, 0) + 1
+                        return host, task
+                self._cond.wait()
+            return None
+
+
+# Artifact mirrors (--mirrors FILE). Each upstream's mirrors are probed once
+# per run and tried fastest first; the canonical upstream is always kept as
+# the last resort and stays the only source of checksums. dlcdn.apache.org
+# carries the current release of every Cassandra series, which is what
+# --all downloads; older releases fail over to archive.apache.org.
+DEFAULT_MIRRORS = {
+    "cassandra": ["https://dlcdn.apache.org/cassandra/"],
+}
+MIRRORABLE_UPSTREAMS = ("cassandra", "elasticsearch")
+MIRROR_PROBE_BYTES = 256 * 1024
+MIRROR_PROBE_TIMEOUT = 10  # seconds
+
+
+def load_mirror_config(path):
+    """Read a mirror file: ``{"cassandra": [url, ...], "elasticsearch": [...]}``.
+
+    Raises ValueError if the file is unreadable or names an upstream that
+    cannot be mirrored.
+    """
+    config = read_json(path)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path} is not a JSON object of mirror lists")
+    mirrors = {}
+    for key, urls in config.items():
+        if key not in MIRRORABLE_UPSTREAMS:
+            raise ValueError(f"{path}: cannot mirror {key!r} (choices: {', '.join(MIRRORABLE_UPSTREAMS)})")
+        if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            raise ValueError(f"{path}: {key!r} must be a list of base URLs")
+        mirrors[key] = [url if url.endswith('/') else url + '/' for url in urls]
+    return mirrors
+
+
+class UpstreamMirrors:
+    """Ranks the mirrors of each upstream by a ranged-GET probe.
+
+    ``rank(key, url)`` maps ``url`` — an artifact under the canonical
+    ``upstreams[key]`` base — onto every configured mirror, probes each
+    mirror and the canonical upstream with a ``Range`` request for the first
+    MIRROR_PROBE_BYTES (concurrently, once per upstream per run) and returns
+    the candidate URLs fastest first. The probe times the first byte and the
+    transfer together, so a nearby but slow mirror loses to a fast one
+    further away. Candidates whose probe failed follow the ones that
+    answered, in configured order with the canonical upstream last, since a
+    mirror may still hold other artifacts.
+    """
+
+    def __init__(self, http, upstreams, mirrors):
+        self.http = http
+        self.upstreams = upstreams
+        self.mirrors = mirrors
+        self._ranked = {}
+        self._lock = threading.Lock()
+
+    def rank(self, key, url):
+        canonical = self.upstreams[key]
+        bases = [base for base in self.mirrors.get(key, []) if base != canonical]
+        if not bases or not url.startswith(canonical):
+            return [url]
+        path = url[len(canonical):]
+        with self._lock:
+            if key not in self._ranked:
+                self._ranked[key] = self._probe(key, bases + [canonical], path)
+            order = self._ranked[key]
+        return [base + path for base in order]
+
+    def _probe(self, key, bases, path):
+        timings = {}
+
+        def probe(base):
+            request = urllib.request.Request(base + path, headers={
+                "User-Agent": USER_AGENT, "Range": f"bytes=0-{MIRROR_PROBE_BYTES - 1}"})
+            started = time.monotonic()
+            try:
+                with self.http.urlopen(request, timeout=MIRROR_PROBE_TIMEOUT) as response:
+                    response.read(MIRROR_PROBE_BYTES)
+                timings[base] = time.monotonic() - started
+            except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+                print(f"  ⚠ Mirror {urlsplit(base).netloc} failed its probe: {e}")
+
+        threads = [threading.Thread(target=probe, args=(base,), daemon=True) for base in bases]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        order = sorted(timings, key=timings.get) + [base for base in bases if base not in timings]
+        if timings:
+            results = ", ".join(f"{urlsplit(base).netloc} {timings[base]:.2f}s" for base in order[:len(timings)])
+            print(f"  Mirror probe for {key}: {results} — using {urlsplit(order[0]).netloc}")
+        return order
+
+
+# --bundle packs the manifest's files into one archive for air-gapped
+# transfer: BUNDLE_MAGIC, each member's bytes (xz-compressed on its own unless
+# the file is compressed already), a JSON index of every member's name,
+# offset, length and sha256, and finally a fixed-size footer pointing at the
+# index. Because members are compressed independently, --unbundle --only can
+# seek straight to one member without decompressing anything before it.
+BUNDLE_MAGIC = b"AXBUNDL1"
+BUNDLE_FOOTER = struct.Struct(">8sQQ")  # magic, index offset, index length
+BUNDLE_STORED_SUFFIXES = (".gz", ".tgz", ".xz", ".bz2", ".zst", ".zip", ".jar", ".deb", ".rpm")
+
+
+def read_bundle_index(f):
+    """Return the index of the --bundle archive open as binary file ``f``."""
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    if end < len(BUNDLE_MAGIC) + BUNDLE_FOOTER.size:
+        raise ValueError("not an offline bundle (file too short)")
+    f.seek(end - BUNDLE_FOOTER.size)
+    magic, index_offset, index_length = BUNDLE_FOOTER.unpack(f.read(BUNDLE_FOOTER.size))
+    f.seek(0)
+    if magic != BUNDLE_MAGIC or f.read(len(BUNDLE_MAGIC)) != BUNDLE_MAGIC:
+        raise ValueError("not an offline bundle (bad magic)")
+    if index_offset + index_length + BUNDLE_FOOTER.size != end:
+        raise ValueError("offline bundle index is corrupt")
+    f.seek(index_offset)
+    return json.loads(f.read(index_length))
+
+
+# --serve publishes the download directory on the LAN: a flat apt repository
+# under /apt/, a yum repository under /yum/ and every file under /.
+DEFAULT_SERVE_ADDRESS = "0.0.0.0:8080"
+RPM_COMMON_NS = "http://linux.duke.edu/metadata/common"
+RPM_NS = "http://linux.duke.edu/metadata/rpm"
+RPM_REPO_NS = "http://linux.duke.edu/metadata/repo"
+RPM_FILELISTS_NS = "http://linux.duke.edu/metadata/filelists"
+
+# RPM header tags read for primary.xml, by tag number.
+RPM_HEADER_TAGS = {
+    1000: 'name', 1001: 'version', 1002: 'release', 1003: 'epoch',
+    1004: 'summary', 1005: 'description', 1006: 'buildtime', 1007: 'buildhost',
+    1009: 'installed_size', 1011: 'vendor', 1014: 'license', 1015: 'packager',
+    1016: 'group', 1020: 'url', 1022: 'arch', 1044: 'sourcerpm', 1046: 'archive_size',
+    1047: 'provide_names', 1048: 'require_flags', 1049: 'require_names',
+    1050: 'require_versions', 1112: 'provide_flags', 1113: 'provide_versions',
+}
+RPMSENSE_COMPARE = {2: 'LT', 4: 'GT', 8: 'EQ', 10: 'LE', 12: 'GE'}
+RPMSENSE_PRE = 0x40 | 0x200 | 0x400   # PREREQ, SCRIPT_PRE, SCRIPT_POST
+RPMSENSE_RPMLIB = 1 << 24
+
+
+def parse_deb822(text):
+    """Parse one deb822 stanza into an ordered ``{field: value}`` dict.
+
+    Continuation lines are kept verbatim (newline + leading space) so the
+    stanza can be written back out unchanged.
+    """
+    fields = {}
+    key = None
+    for line in text.splitlines():
+        if line[:1] in (' ', '\t') and key:
+            fields[key] += '\n' + line
+        elif ':' in line:
+            key, _, value = line.partition(':')
+            fields[key] = value.strip()
+    return fields
+
+
+def read_deb_control(path):
+    """Return the control fields of the Debian package at ``path``.
+
+    A .deb is an ``ar`` archive; its ``control.tar[.gz|.xz]`` member holds
+    the ``control`` file. zstd-compressed control archives are not
+    supported by the standard library and raise ValueError.
+    """
+    with open(path, 'rb') as f:
+        if f.read(8) != b'!<arch>\n':
+            raise ValueError(f"{Path(path).name} is not a Debian package")
+        while True:
+            header = f.read(60)
+            if len(header) < 60:
+                break
+            name = header[:16].decode('ascii', 'replace').strip().rstrip('/')
+            size = int(header[48:58])
+            if not name.startswith('control.tar'):
+                f.seek(size + size % 2, os.SEEK_CUR)
+                continue
+            try:
+                with tarfile.open(fileobj=io.BytesIO(f.read(size)), mode='r:*') as tar:
+                    member = next(m for m in tar.getmembers()
+                                  if m.isfile() and m.name.lstrip('./') == 'control')
+                    return parse_deb822(tar.extractfile(member).read().decode('utf-8', 'replace'))
+            except (tarfile.TarError, StopIteration) as e:
+                raise ValueError(f"unreadable {name} in {Path(path).name}: {e or 'no control file'}")
+    raise ValueError(f"{Path(path).name} has no control archive")
+
+
+def _read_rpm_header_structure(f):
+    """Read one RPM header structure; return ``(entries, store, length)``."""
+    intro = f.read(16)
+    if len(intro) < 16 or intro[:3] != b'\x8e\xad\xe8':
+        raise ValueError("bad RPM header magic")
+    nindex, hsize = struct.unpack('>II', intro[8:16])
+    entries = [struct.unpack('>iiii', f.read(16)) for _ in range(nindex)]
+    store = f.read(hsize)
+    return entries, store, 16 + 16 * nindex + hsize
+
+
+def read_rpm_header(path):
+    """Return the RPM header fields primary.xml needs for the package at ``path``.
+
+    Parses the lead, skips the signature header and decodes the tags in
+    ``RPM_HEADER_TAGS`` from the main header. ``header_range`` is the byte
+    range of the main header, which yum reports as ``rpm:header-range``.
+    Raises ValueError for a truncated or malformed package.
+    """
+    name = Path(path).name
+    try:
+        with open(path, 'rb') as f:
+            if f.read(96)[:4] != b'\xed\xab\xee\xdb':
+                raise ValueError(f"{name} is not an RPM package")
+            _, _, signature_length = _read_rpm_header_structure(f)
+            f.seek(96 + signature_length + (-signature_length % 8))
+            start = f.tell()
+            entries, store, length = _read_rpm_header_structure(f)
+
+        header = {'header_range': [start, start + length]}
+        for tag, kind, offset, n_items in entries:
+            field = RPM_HEADER_TAGS.get(tag)
+            if field is None:
+                continue
+            if kind in (3, 4, 5):
+                fmt = {3: 'h', 4: 'i', 5: 'q'}[kind]
+                values = list(struct.unpack_from(f'>{n_items}{fmt}', store, offset))
+            elif kind in (6, 8, 9):
+                values = store[offset:].split(b'\0', n_items if kind == 8 else 1)[:n_items if kind == 8 else 1]
+                values = [v.decode('utf-8', 'replace') for v in values]
+            else:
+                continue
+            if field.endswith(('_names', '_flags', '_versions')):
+                header[field] = values
+            elif values:
+                header[field] = values[0]
+            else:
+                raise ValueError(f"{name}: RPM header tag {tag} has no value")
+    except struct.error as e:
+        raise ValueError(f"{name}: malformed RPM header: {e}") from None
+    return header
+
+
+class MirrorIndex:
+    """Repository metadata for the download directory, built from manifest.json.
+
+    Generates a flat apt repository (``Packages``, ``Packages.gz``,
+    ``Release``) from the .deb files and a yum repository (``repodata/``)
+    from the .rpm files listed in the manifest. Control data read from each
+    package is cached in ``<state dir>/mirror.json`` by sha256, so only new
+    packages are opened. The index is rebuilt whenever the manifest changes.
+    """
+
+    def __init__(self, download_dir, state_dir):
+        self.download_dir = Path(download_dir)
+        self.manifest_path = self.download_dir / "manifest.json"
+        self.cache_path = Path(state_dir) / "mirror.json"
+        self._lock = threading.Lock()
+        self._signature = None
+        self.files = {}
+        self.generated = {}
+
+    def refresh(self):
+        """Rebuild the index if manifest.json changed since the last build."""
+        try:
+            stat = self.manifest_path.stat()
+        except OSError:
+            raise FileNotFoundError(f"{self.manifest_path} not found; download something first")
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if signature != self._signature:
+                self._build(read_json(self.manifest_path) or {})
+                self._signature = signature
+
+    def _build(self, manifest):
+        cache = read_json(self.cache_path) or {}
+        changed = {}
+        files = {entry['name']: entry for entry in manifest.get('files', [])
+                 if (self.download_dir / entry['name']).is_file()}
+        stanzas, rpms = [], []
+        for name, entry in sorted(files.items()):
+            if not name.endswith(('.deb', '.rpm')):
+                continue
+            cached = cache.get(name)
+            if cached and cached.get('sha256') == entry.get('sha256'):
+                meta = cached['meta']
+            else:
+                try:
+                    reader = read_deb_control if name.endswith('.deb') else read_rpm_header
+                    meta = reader(self.download_dir / name)
+                except (OSError, ValueError) as e:
+                    print(f"  ⚠ {name}: {e}; not listed in the repository index")
+                    continue
+                changed[name] = {'sha256': entry.get('sha256'), 'meta': meta}
+            if name.endswith('.deb'):
+                stanzas.append(self._apt_stanza(name, entry, meta))
+            else:
+                rpms.append((name, entry, meta))
+
+        if changed or any(name not in files for name in cache):
+            def merge(data):
+                data.update(changed)
+                for name in [n for n in data if n not in files]:
+                    del data[name]
+            update_json_locked(self.cache_path, merge)
+
+        generated = {}
+        packages = '\n'.join(stanzas).encode('utf-8')
+        generated['apt/Packages'] = packages
+        generated['apt/Packages.gz'] = gzip.compress(packages, mtime=0)
+        generated['apt/Release'] = self._apt_release(generated)
+        generated.update(self._yum_repodata(rpms))
+        self.files = files
+        self.generated = generated
+        print(f"  Mirror index: {len(stanzas)} deb, {len(rpms)} rpm, {len(files)} files")
+
+    def _apt_stanza(self, name, entry, control):
+        fields = dict(control)
+        fields.update({'Filename': f"./{name}", 'Size': str(entry['size']), 'SHA256': entry['sha256']})
+        return ''.join(f"{key}: {value}\n" for key, value in fields.items())
+
+    def _apt_release(self, generated):
+        lines = [
+            "Origin: AxonOps offline mirror",
+            "Label: AxonOps offline mirror",
+            f"Date: {formatdate(usegmt=True)}",
+            "SHA256:",
+        ]
+        for path in ('apt/Packages', 'apt/Packages.gz'):
+            data = generated[path]
+            lines.append(f" {hashlib.sha256(data).hexdigest()} {len(data)} {posixpath.basename(path)}")
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def _yum_repodata(self, rpms):
+        """Return ``{path: bytes}`` for repomd.xml, primary.xml.gz and filelists.xml.gz.
+
+        Elements are written with literal ``rpm:`` prefixes and explicit
+        ``xmlns`` attributes, which is the exact layout createrepo produces.
+        """
+        primary = ET.Element('metadata', xmlns=RPM_COMMON_NS, packages=str(len(rpms)))
+        primary.set('xmlns:rpm', RPM_NS)
+        filelists = ET.Element('filelists', xmlns=RPM_FILELISTS_NS, packages=str(len(rpms)))
+        for name, entry, header in rpms:
+            version = {'epoch': str(header.get('epoch', 0)), 'ver': header.get('version', ''),
+                       'rel': header.get('release', '')}
+            package = ET.SubElement(primary, 'package', type='rpm')
+            for tag in ('name', 'arch'):
+                ET.SubElement(package, tag).text = header.get(tag, '')
+            ET.SubElement(package, 'version', version)
+            ET.SubElement(package, 'checksum', type='sha256', pkgid='YES').text = entry['sha256']
+            for tag in ('summary', 'description', 'packager', 'url'):
+                ET.SubElement(package, tag).text = header.get(tag, '')
+            mtime = int((self.download_dir / name).stat().st_mtime)
+            ET.SubElement(package, 'time', file=str(mtime), build=str(header.get('buildtime', 0)))
+            ET.SubElement(package, 'size', package=str(entry['size']),
+                          installed=str(header.get('installed_size', 0)),
+                          archive=str(header.get('archive_size', 0)))
+            ET.SubElement(package, 'location', href=name)
+            fmt = ET.SubElement(package, 'format')
+            for tag in ('license', 'vendor', 'group', 'buildhost', 'sourcerpm'):
+                ET.SubElement(fmt, f'rpm:{tag}').text = header.get(tag, '')
+            start, end = header['header_range']
+            ET.SubElement(fmt, 'rpm:header-range', start=str(start), end=str(end))
+            for kind in ('provide', 'require'):
+                deps = self._rpm_dependencies(header, kind)
+                if deps:
+                    container = ET.SubElement(fmt, f'rpm:{kind}s')
+                    for attrs in deps:
+                        ET.SubElement(container, 'rpm:entry', attrs)
+
+            listed = ET.SubElement(filelists, 'package', pkgid=entry['sha256'],
+                                   name=header.get('name', ''), arch=header.get('arch', ''))
+            ET.SubElement(listed, 'version', version)
+
+        generated = {}
+        repomd = ET.Element('repomd', xmlns=RPM_REPO_NS)
+        repomd.set('xmlns:rpm', RPM_NS)
+        timestamp = str(int(time.time()))
+        ET.SubElement(repomd, 'revision').text = timestamp
+        for kind, root in (('primary', primary), ('filelists', filelists)):
+            xml = ET.tostring(root, encoding='utf-8', xml_declaration=True)
+            compressed = gzip.compress(xml, mtime=0)
+            digest = hashlib.sha256(compressed).hexdigest()
+            location = f"repodata/{digest}-{kind}.xml.gz"
+            generated[f"yum/{location}"] = compressed
+            data = ET.SubElement(repomd, 'data', type=kind)
+            ET.SubElement(data, 'checksum', type='sha256').text = digest
+            ET.SubElement(data, 'open-checksum', type='sha256').text = hashlib.sha256(xml).hexdigest()
+            ET.SubElement(data, 'location', href=location)
+            ET.SubElement(data, 'timestamp').text = timestamp
+            ET.SubElement(data, 'size').text = str(len(compressed))
+            ET.SubElement(data, 'open-size').text = str(len(xml))
+        generated['yum/repodata/repomd.xml'] = ET.tostring(repomd, encoding='utf-8', xml_declaration=True)
+        return generated
+
+    def _rpm_dependencies(self, header, kind):
+        """Return primary.xml ``rpm:entry`` attributes for provides or requires."""
+        names = header.get(f"{kind}_names") or []
+        flags = header.get(f"{kind}_flags") or [0] * len(names)
+        versions = header.get(f"{kind}_versions") or [''] * len(names)
+        deps = []
+        for name, flag, version in zip(names, flags, versions):
+            if flag & RPMSENSE_RPMLIB or name.startswith('rpmlib('):
+                continue
+            attrs = {'name': name}
+            compare = RPMSENSE_COMPARE.get(flag & 0xe)
+            if compare and version:
+                epoch, _, rest = version.rpartition(':')
+                ver, _, rel = rest.partition('-')
+                attrs.update({'flags': compare, 'epoch': epoch or '0', 'ver': ver})
+                if rel:
+                    attrs['rel'] = rel
+            if kind == 'require' and flag & RPMSENSE_PRE:
+                attrs['pre'] = '1'
+            deps.append(attrs)
+        return deps
+
+    def lookup(self, path):
+        """Return ``(bytes_or_None, file_path_or_None, etag)`` for a request path."""
+        path = posixpath.normpath(path).lstrip('/')
+        with self._lock:
+            generated, files = self.generated, self.files
+        if path in generated:
+            data = generated[path]
+            return data, None, f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+        directory, name = posixpath.split(path)
+        allowed = {'': True, 'apt': name.endswith('.deb'), 'yum': name.endswith('.rpm')}
+        entry = files.get(name)
+        if entry and allowed.get(directory):
+            return None, self.download_dir / name, f'"{entry["sha256"]}"'
+        return None, None, None
+
+
+class MirrorRequestHandler(BaseHTTPRequestHandler):
+    """Serves a MirrorIndex over HTTP/1.1 with keep-alive and single byte ranges."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "axonops-offline-mirror"
+    content_types = {'.deb': 'application/vnd.debian.binary-package', '.rpm': 'application/x-rpm',
+                     '.gz': 'application/gzip', '.xml': 'application/xml', '.json': 'application/json'}
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def _serve(self, head):
+        path = unquote(urlsplit(self.path).path)
+        if path == '/':
+            return self._send_listing(head)
+        try:
+            self.server.index.refresh()
+        except (OSError, ValueError) as e:
+            return self.send_error(503, str(e))
+        data, file_path, etag = self.server.index.lookup(path)
+        if data is None and file_path is None:
+            return self.send_error(404)
+        try:
+            stat = file_path.stat() if file_path else None
+        except OSError:
+            return self.send_error(404)
+        size = stat.st_size if stat else len(data)
+        last_modified = formatdate(stat.st_mtime if stat else time.time(), usegmt=True)
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        try:
+            byte_range = self._byte_range(size, (etag, last_modified))
+        except ValueError:
+            self.send_response(416)
+            self.send_header('Content-Range', f"bytes */{size}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        start, end = byte_range or (0, size - 1)
+        length = max(0, end - start + 1)
+
+        self.send_response(206 if byte_range else 200)
+        self.send_header('Content-Type', self.content_types.get(
+            os.path.splitext(path)[1], 'application/octet-stream'))
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        if byte_range:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if head or not length:
+            return
+        try:
+            if data is not None:
+                self.wfile.write(data[start:end + 1])
+            else:
+                with open(file_path, 'rb') as f:
+                    self.connection.sendfile(f, start, length)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _byte_range(self, size, validators):
+        """Return the ``(start, end)`` of a satisfiable single-range request, or None.
+
+        Multi-range and malformed headers are ignored (the full body is sent),
+        as is a ``Range`` whose ``If-Range`` no longer matches. Raises
+        ValueError for a range that lies beyond the end of the file.
+        """
+        header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if not header or (if_range and if_range not in validators):
+            return None
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+        if not match or not any(match.groups()):
+            return None
+        first, last = match.groups()
+        if not first:
+            suffix = int(last)
+            if not suffix:
+                raise ValueError("empty suffix range")
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            raise ValueError("range not satisfiable")
+        return start, end
+
+    def _send_listing(self, head):
+        host = self.headers.get('Host') or f"{self.server.server_address[0]}:{self.server.server_address[1]}"
+        try:
+            self.server.index.refresh()
+            names = sorted(self.server.index.files)
+        except (OSError, ValueError) as e:
+            names = [f"(no manifest: {e})"]
+        body = '\n'.join([
+            "AxonOps offline mirror",
+            "",
+            f"apt: deb [trusted=yes] http://{host}/apt ./",
+            f"yum: baseurl=http://{host}/yum  gpgcheck=0",
+            "",
+            *names,
+        ]).encode('utf-8') + b'\n'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+
+class MirrorServer(ThreadingHTTPServer):
+    """Thread-per-connection HTTP server with a deep accept backlog."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, index):
+        self.index = index
+        super().__init__(address, MirrorRequestHandler)
+
+
+def parse_listen_address(value):
+    """Parse ``[HOST:]PORT`` for --listen."""
+    host, _, port = value.rpartition(':')
+    if not port.isdigit():
+        raise argparse.ArgumentTypeError(f"invalid listen address: {value!r}")
+    return (host.strip('[]') or '0.0.0.0', int(port))
+
+
+# Default number of parallel download workers (--jobs). 1 keeps the classic
+# strictly sequential behaviour, including the live progress bar.
+DEFAULT_JOBS = 1
 
 class PackageDownloader:
-    def __init__(self, download_dir=DOWNLOAD_DIR):
+    def __init__(self, download_dir=DOWNLOAD_DIR, jobs=DEFAULT_JOBS, buffer_size=DEFAULT_BUFFER_SIZE,
+                 store_dir=None, limit_rate=None, host_limits=None, upstreams=None, mirrors=None):
         self.download_dir = Path(download_dir)
+        self.upstreams = dict(UPSTREAMS, **(upstreams or {}))
         self.download_dir.mkdir(parents=True, exist_ok=True)
+        self.state_dir = self.download_dir / STATE_DIR_NAME
+        self.buffer_size = buffer_size
+        self.digest_index = DigestIndex(self.state_dir / 'digests.json', self.download_dir)
+        self.checksum_cache_path = self.state_dir / 'checksums.json'
+        self.checksum_cache = read_json(self.checksum_cache_path) or {}
+        # --host-limit overrides are layered over the built-in per-host limits
+        # and shared by the connection pool and the transfer scheduler.
+        self.host_limits = dict(HOST_CONNECTION_LIMITS, **(host_limits or {}))
+        self.http = HTTPConnectionPool(host_limits=self.host_limits,
+                                       rate_limiter=TokenBucket(limit_rate) if limit_rate else None)
+        self.store = ArtifactStore(store_dir) if store_dir else None
+        # Configured mirror lists replace the built-in ones per upstream; the
+        # built-in ones only apply while the upstream itself is the default.
+        mirrors = dict(mirrors or {})
+        for key, urls in DEFAULT_MIRRORS.items():
+            if key not in mirrors and self.upstreams[key] == UPSTREAMS[key]:
+                mirrors[key] = urls
+        self.mirrors = UpstreamMirrors(self.http, self.upstreams, mirrors)
         self.version_cache_file = self.download_dir.parent / 'scripts' / 'version_cache.json'
-        self.cache_ttl = 3600  # 1 hour
+        self.version_cache = VersionCache(self.version_cache_file)
+        # With stale_while_revalidate, an expired cache entry is returned at
+        # once and refreshed on a background thread for the next run.
+        self.stale_while_revalidate = False
+        # --watch sets revalidate_versions: every cached version list is then
+        # checked with a conditional request, whatever its age.
+        self.revalidate_versions = False
+        self._discovery_validators = {}
+        self._refreshing = {}
+        self._refresh_lock = threading.Lock()
+        # Results of discover(), keyed "cassandra", "elasticsearch", "java_<arch>".
+        self.discovered = {}
+        # The manifest of the previous run, by file name. In sync mode,
+        # artifacts it lists that are still intact on disk are not queued.
+        self.previous_manifest = {
+            entry['name']: entry
+            for entry in (read_json(self.download_dir / "manifest.json") or {}).get('files', [])
+        }
+        self.sync = False
+        self.unchanged = []
+        # Every file name resolved in this run, whether queued or unchanged,
+        # and what --write-lock records for it.
+        self.resolved = set()
+        self.locked = {}
+
+        # Downloads are queued by the download_* methods and executed by
+        # run_downloads() through the scheduler's bounded worker pool. The
+        # per-line progress bar only makes sense for a single transfer, so it
+        # is disabled when more than one worker can be writing to the
+        # terminal at once.
+        self.jobs = max(1, int(jobs))
+        self.show_progress = self.jobs == 1
+        self.scheduler = TransferScheduler(self.jobs, self.host_limits)
+        self.results = []
+        self._print_lock = threading.Lock()
+        # One record per download_file() call, for --metrics-json.
+        self.metrics = []
+        self._metrics_lock = threading.Lock()
+
+    def _print(self, *lines):
+        """Print whole lines atomically so parallel workers don't interleave."""
+        with self._print_lock:
+            for line in lines:
+                print(line, flush=True)
+
+    def enqueue(self, label, url, func, *args, size=None, sha256=None):
+        """Queue ``func(*args)`` as one download from ``url``, reported as ``label``.
+
+        ``size`` (bytes, when the repository metadata states it) decides where
+        the task goes in the scheduler's queue.
+        In sync mode a file the previous manifest already lists is not queued
+        at all while it is intact on disk and, when the repository states a
+        ``sha256``, that still matches.
+        """
+        name = os.path.basename(urlsplit(url).path)
+        self.resolved.add(name)
+        self.locked[name] = {'name': name, 'label': label, 'url': url}
+        if self.sync and self._unchanged_since_manifest(name, sha256):
+            self.unchanged.append(name)
+            return
+        self.scheduler.submit((label, func, args), url, size)
+
+    def _unchanged_since_manifest(self, name, sha256=None):
+        previous = self.previous_manifest.get(name)
+        if not previous or not previous.get('sha256'):
+            return False
+        if sha256 and previous['sha256'] != sha256.lower():
+            return False
+        return self.digest_index.lookup(self.download_dir / name) == previous['sha256']
+
+    def write_lock(self, path):
+        """Write every artifact resolved in this run, pinned, to the lock file ``path``.
+
+        Each entry records the artifact's URL, size, version and the sha256
+        of the file now on disk, so ``--from-lock`` can fetch exactly the
+        same set again without any discovery. Returns the number pinned.
+        """
+        artifacts = []
+        for name in sorted(self.locked):
+            file_path = self.download_dir / name
+            sha256 = self.digest_index.lookup(file_path) if file_path.exists() else None
+            if not sha256:
+                print(f"  ⚠ {name} is not on disk; left out of the lock file")
+                continue
+            identity = artifact_identity(name) or {}
+            artifacts.append(dict(self.locked[name], version=identity.get('version'),
+                                  size=file_path.stat().st_size, sha256=sha256))
+        with open(path, 'w') as f:
+            json.dump({'format': 1, 'created': utc_now(), 'artifacts': artifacts}, f, indent=2)
+        print(f"✓ Lock file written with {len(artifacts)} artifact(s): {path}")
+        return len(artifacts)
+
+    def download_from_lock(self, path):
+        """Queue every artifact pinned in the lock file ``path``.
+
+        No version discovery, repository metadata or checksum sidecar is
+        requested. Each file is verified against its pinned sha256, so a
+        populated directory only costs local digest checks.
+        """
+        lock = read_json(path)
+        if not isinstance(lock, dict) or not isinstance(lock.get('artifacts'), list):
+            raise ValueError(f"{path} is not a lock file written by --write-lock")
+        print(f"\n=== Locked Downloads ({len(lock['artifacts'])} from {path}) ===")
+        for entry in lock['artifacts']:
+            file_path = self.download_dir / entry['name']
+            self.enqueue(entry['label'], entry['url'], self._download_locked, entry['url'], file_path,
+                         entry['sha256'], size=entry.get('size'), sha256=entry['sha256'])
+
+    def _download_locked(self, url, file_path, sha256):
+        """Fetch one pinned artifact, through the upstream's mirrors when it has any."""
+        urls = [url]
+        if not (file_path.exists() and self.digest_index.lookup(file_path) == sha256):
+            key = next((key for key in MIRRORABLE_UPSTREAMS if url.startswith(self.upstreams[key])), None)
+            if key:
+                urls = self.mirrors.rank(key, url)
+        return self._download_from(urls, file_path, sha256)
+
+    def run_downloads(self):
+        """Run every queued download on a pool of ``self.jobs`` workers.
+
+        Each task keeps download_file's own retry and truncation handling; a
+        task that still fails is recorded rather than aborting the others.
+        Outcomes accumulate in ``self.results`` as ``(label, error_or_None)``.
+        """
+        if not len(self.scheduler):
+            return
+
+        def run(task):
+            label, func, args = task
+            try:
+                func(*args)
+            except Exception as e:
+                self._print(f"  ✗ Error downloading {label}: {e}")
+                return (label, e)
+            self._print(f"  ✓ Downloaded {label}")
+            return (label, None)
+
+        if self.jobs > 1:
+            self._print(f"\nDownloading {len(self.scheduler)} files with {self.jobs} parallel workers...")
+        self.results.extend(self.scheduler.run(run))
+
+    def print_summary(self):
+        """Print one summary of every download attempted; return the failure count."""
+        failed = [(label, error) for label, error in self.results if error is not None]
+        succeeded = len(self.results) - len(failed)
+        print("\n=== Download Summary ===")
+        print(f"  ✓ {succeeded} succeeded")
+        if failed:
+            print(f"  ✗ {len(failed)} failed:")
+            for label, error in sorted(failed, key=lambda item: item[0]):
+                print(f"    - {label}: {error}")
+        return len(failed)
+
+    def write_metrics(self, path):
+        """Write per-artifact transfer metrics, with a per-host rollup, as JSON.
+
+        ``artifacts`` holds one record per download_file() call, failed
+        mirror attempts included. ``hosts`` totals the bytes actually
+        transferred per host, so slow hosts stand out.
+        """
+        with self._metrics_lock:
+            artifacts = sorted(self.metrics, key=lambda m: m['name'])
+        hosts = {}
+        for record in artifacts:
+            host = hosts.setdefault(record['host'], {
+                'files': 0, 'failed': 0, 'bytes': 0, 'transfer_seconds': 0.0, 'retries': 0, 'ttfb_seconds': []})
+            host['files'] += 1
+            host['failed'] += record['outcome'] == 'failed'
+            host['bytes'] += record['bytes']
+            host['transfer_seconds'] += record['transfer_seconds']
+            host['retries'] += record['retries']
+            if record['ttfb_seconds'] is not None:
+                host['ttfb_seconds'].append(record['ttfb_seconds'])
+        for host in hosts.values():
+            ttfb = host.pop('ttfb_seconds')
+            host['mean_ttfb_seconds'] = round(sum(ttfb) / len(ttfb), 3) if ttfb else None
+            host['transfer_seconds'] = round(host['transfer_seconds'], 3)
+            host['throughput_bytes_per_second'] = (
+                round(host['bytes'] / host['transfer_seconds']) if host['transfer_seconds'] else None)
+        with open(path, 'w') as f:
+            json.dump({'generated': utc_now(), 'jobs': self.jobs, 'hosts': hosts, 'artifacts': artifacts},
+                      f, indent=2)
+        print(f"✓ Transfer metrics written: {path}")
 
     def get_cached_version(self, key):
         """Get cached version info if not expired."""
-        if not self.version_cache_file.exists():
-            return None
-
-        try:
-            with open(self.version_cache_file, 'r') as f:
-                cache = json.load(f)
-
-            if key in cache:
-                cached_time = cache[key].get('timestamp', 0)
-                if time.time() - cached_time < self.cache_ttl:
-                    return cache[key]['data']
-        except:
-            pass
-
-        return None
+        data, fresh = self.version_cache.get(key)
+        return data if fresh else None
 
     def set_cached_version(self, key, data):
         """Cache version info."""
-        cache = {}
-        if self.version_cache_file.exists():
+        self.version_cache.set(key, data, self._discovery_validators.get(key))
+
+    def _fetch_discovery(self, key, request, timeout):
+        """GET a version discovery endpoint, conditionally once ``key`` is cached.
+
+        The ETag/Last-Modified stored with the cached value are sent as
+        If-None-Match/If-Modified-Since. Returns the response body, or None
+        when the server answered ``304`` and the cached value still stands.
+        """
+        if isinstance(request, str):
+            request = urllib.request.Request(request, headers={"User-Agent": USER_AGENT})
+        cached, _ = self.version_cache.get(key)
+        validators = self.version_cache.validators(key) if cached else {}
+        if validators.get('etag'):
+            request.add_header('If-None-Match', validators['etag'])
+        if validators.get('last_modified'):
+            request.add_header('If-Modified-Since', validators['last_modified'])
+        with self.http.urlopen(request, timeout=timeout) as response:
+            if response.status == 304 and cached:
+                self._discovery_validators[key] = validators
+                return None
+            body = response.read()
+            self._discovery_validators[key] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+        return body
+
+    def _cached_discovery(self, key, fetch, fallback, description):
+        """Resolve ``key`` from the version cache, ``fetch()`` or ``fallback``.
+
+        A fresh cache entry is returned as-is, unless revalidate_versions is
+        set. An expired one is returned immediately when
+        stale-while-revalidate is on, with ``fetch()`` run in the background
+        to refresh it; otherwise ``fetch()`` runs inline. ``fetch()`` returns
+        None when a conditional request confirmed the cached value, which
+        then counts as fresh again. If fetching fails, the last known value
+        beats the built-in ``fallback``.
+        """
+        cached, fresh = self.version_cache.get(key)
+        if cached and fresh and not self.revalidate_versions:
+            return cached
+        if cached and self.stale_while_revalidate:
+            self._revalidate(key, fetch, description)
+            return cached
+        try:
+            data = fetch()
+            if data is None:
+                data = cached
+            self.set_cached_version(key, data)
+            return data
+        except Exception as e:
+            print(f"Warning: Could not fetch latest {description}: {e}")
+            return cached or fallback
+
+    def _revalidate(self, key, fetch, description):
+        """Refresh ``key`` on a background thread (once per key per run)."""
+        def refresh():
             try:
-                with open(self.version_cache_file, 'r') as f:
-                    cache = json.load(f)
-            except:
-                pass
-
-        cache[key] = {
-            'timestamp': time.time(),
-            'data': data
-        }
+                data = fetch()
+                self.set_cached_version(key, self.version_cache.get(key)[0] if data is None else data)
+            except Exception as e:
+                self._print(f"Warning: Background refresh of {description} failed: {e}")
 
-        # Ensure scripts directory exists
-        self.version_cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            thread = threading.Thread(target=refresh, name=f"refresh-{key}", daemon=True)
+            self._refreshing[key] = thread
+        thread.start()
+
+    def wait_for_refreshes(self, timeout=30):
+        """Give background version refreshes a chance to land in the cache."""
+        deadline = time.time() + timeout
+        for thread in list(self._refreshing.values()):
+            thread.join(max(0, deadline - time.time()))
+
+    def discover(self, cassandra=False, elasticsearch=False, java_arches=()):
+        """Resolve upstream versions for every requested component at once.
+
+        Each lookup runs on its own thread and is given its endpoint's
+        DISCOVERY_TIMEOUTS budget, measured from the start of discovery. A
+        lookup that fails falls back inside its get_latest_* method; one that
+        runs out of time is replaced by the cached value or the built-in
+        CASSANDRA_VERSIONS / ELASTICSEARCH_VERSIONS / JAVA_DISTRIBUTIONS entry.
+        """
+        lookups = {}
+        if cassandra:
+            lookups['cassandra'] = ('cassandra', self.get_latest_cassandra_versions, (),
+                                    lambda: self.version_cache.get('cassandra_versions')[0] or CASSANDRA_VERSIONS)
+        if elasticsearch:
+            lookups['elasticsearch'] = ('elasticsearch', self.get_latest_elasticsearch_versions, (),
+                                        lambda: self.version_cache.get('elasticsearch_versions')[0] or ELASTICSEARCH_VERSIONS)
+        for arch in java_arches:
+            lookups[f'java_{arch}'] = ('java', self.get_latest_zulu_java_17_url, (arch,),
+                                       lambda arch=arch: self.version_cache.get(f'zulu_java_17_{arch}')[0]
+                                       or self._fallback_java_url(arch))
+        lookups = {key: lookup for key, lookup in lookups.items() if key not in self.discovered}
+        if not lookups:
+            return
 
-        with open(self.version_cache_file, 'w') as f:
-            json.dump(cache, f, indent=2)
+        started = time.time()
+        pool = ThreadPoolExecutor(max_workers=len(lookups), thread_name_prefix="discover")
+        futures = {key: pool.submit(func, *args) for key, (_, func, args, _) in lookups.items()}
+        for key, future in futures.items():
+            endpoint, _, _, fallback = lookups[key]
+            remaining = started + DISCOVERY_TIMEOUTS[endpoint] - time.time()
+            try:
+                self.discovered[key] = future.result(timeout=max(0, remaining))
+            except TimeoutError:
+                print(f"Warning: {endpoint} version lookup timed out after "
+                      f"{DISCOVERY_TIMEOUTS[endpoint]}s; using cached/built-in versions")
+                self.discovered[key] = fallback()
+        pool.shutdown(wait=False, cancel_futures=True)
+        print(f"Resolved {len(lookups)} upstream version lookup(s) in {time.time() - started:.1f}s")
 
     def get_latest_zulu_java_17_url(self, arch='x64'):
         """Get the latest Azul Zulu JDK 17 download URL."""
-        cache_key = f'zulu_java_17_{arch}'
-        cached = self.get_cached_version(cache_key)
-        if cached:
-            return cached
-
         # Map our arch names to Azul's naming
         arch_map = {
             'x64': 'x64',
@@ -143,33 +2009,24 @@ class PackageDownloader:
         }
         azul_arch = arch_map.get(arch, 'x64')
 
-        api_url = f"https://api.azul.com/zulu/download/community/v1.0/bundles/latest/?jdk_version=17&os=linux&arch={azul_arch}&hw_bitness=64&bundle_type=jdk&javafx=false&ext=tar.gz"
+        api_url = f"{self.upstreams['zulu_api']}?jdk_version=17&os=linux&arch={azul_arch}&hw_bitness=64&bundle_type=jdk&javafx=false&ext=tar.gz"
 
-        try:
+        def fetch():
             print(f"Fetching latest Zulu JDK 17 version for {arch}...")
-            with urllib.request.urlopen(api_url) as response:
-                data = json.loads(response.read())
-                url = data['url']
-                self.set_cached_version(cache_key, url)
-                return url
-        except Exception as e:
-            print(f"Warning: Could not fetch latest Zulu version: {e}")
-            # Fallback to hardcoded URL
-            fallback_urls = {
-                'x64': 'https://cdn.azul.com/zulu/bin/zulu17.54.21-ca-jdk17.0.13-linux_x64.tar.gz',
-                'aarch64': 'https://cdn.azul.com/zulu/bin/zulu17.54.21-ca-jdk17.0.13-linux_aarch64.tar.gz'
-            }
-            return fallback_urls.get(arch, fallback_urls['x64'])
+            body = self._fetch_discovery(f'zulu_java_17_{arch}', api_url, DISCOVERY_TIMEOUTS['java'])
+            return None if body is None else json.loads(body)['url']
+
+        return self._cached_discovery(f'zulu_java_17_{arch}', fetch,
+                                      self._fallback_java_url(arch), "Zulu version")
+
+    def _fallback_java_url(self, arch):
+        """Built-in Zulu JDK 17 URL for ``arch`` from JAVA_DISTRIBUTIONS."""
+        platforms = JAVA_DISTRIBUTIONS["azul_17"]["platforms"]
+        return platforms.get(f"linux_{arch}", platforms["linux_x64"])
 
     def get_latest_cassandra_versions(self):
         """Get the latest versions of each Cassandra major release."""
-        cache_key = 'cassandra_versions'
-        cached = self.get_cached_version(cache_key)
-        if cached:
-            return cached
-
-        versions = {}
-        base_url = "https://archive.apache.org/dist/cassandra/"
+        base_url = self.upstreams['cassandra']
 
         class CassandraHTMLParser(HTMLParser):
             def __init__(self):
@@ -184,64 +2041,58 @@ class PackageDownloader:
                             if re.match(r'^\d+\.\d+(\.\d+)?$', version):
                                 self.versions.append(version)
 
-        try:
+        def fetch():
             print("Fetching latest Cassandra versions...")
-            with urllib.request.urlopen(base_url) as response:
-                parser = CassandraHTMLParser()
-                parser.feed(response.read().decode('utf-8'))
-
-                # Group by major version
-                for version in sorted(parser.versions, reverse=True):
-                    major = '.'.join(version.split('.')[:2])
-                    if major not in versions:
-                        versions[major] = []
-                    if len(versions[major]) < 5:  # Keep top 5 versions per major
-                        versions[major].append(version)
-
-                self.set_cached_version(cache_key, versions)
-                return versions
-        except Exception as e:
-            print(f"Warning: Could not fetch latest Cassandra versions: {e}")
-            # Return hardcoded fallback
-            return CASSANDRA_VERSIONS
+            versions = {}
+            body = self._fetch_discovery('cassandra_versions', base_url, DISCOVERY_TIMEOUTS['cassandra'])
+            if body is None:
+                return None
+            parser = CassandraHTMLParser()
+            parser.feed(body.decode('utf-8'))
+
+            # Group by major version
+            for version in sorted(parser.versions, key=version_key, reverse=True):
+                major = '.'.join(version.split('.')[:2])
+                if major not in versions:
+                    versions[major] = []
+                if len(versions[major]) < 5:  # Keep top 5 versions per major
+                    versions[major].append(version)
+            return versions
+
+        # Hardcoded fallback: CASSANDRA_VERSIONS
+        return self._cached_discovery('cassandra_versions', fetch, CASSANDRA_VERSIONS, "Cassandra versions")
 
     def get_latest_elasticsearch_versions(self):
         """Get the latest versions of Elasticsearch."""
-        cache_key = 'elasticsearch_versions'
-        cached = self.get_cached_version(cache_key)
-        if cached:
-            return cached
-
-        # Only support Elasticsearch 7
-        versions = {'7': []}
-
-        try:
+        def fetch():
             print("Fetching latest Elasticsearch 7 versions...")
+            # Only support Elasticsearch 7
+            versions = {'7': []}
             # Use GitHub API to get releases
-            api_url = "https://api.github.com/repos/elastic/elasticsearch/releases?per_page=50"
+            api_url = self.upstreams['elasticsearch_releases']
             headers = {"User-Agent": USER_AGENT}
             request = urllib.request.Request(api_url, headers=headers)
 
-            with urllib.request.urlopen(request) as response:
-                releases = json.loads(response.read())
+            body = self._fetch_discovery('elasticsearch_versions', request, DISCOVERY_TIMEOUTS['elasticsearch'])
+            if body is None:
+                return None
+            releases = json.loads(body)
 
-                for release in releases:
-                    tag = release.get('tag_name', '').lstrip('v')
-                    if re.match(r'^7\.\d+\.\d+$', tag):  # Only match 7.x.x versions
-                        if len(versions['7']) < 5:
-                            versions['7'].append(tag)
+            for release in releases:
+                tag = release.get('tag_name', '').lstrip('v')
+                if re.match(r'^7\.\d+\.\d+$', tag):  # Only match 7.x.x versions
+                    if len(versions['7']) < 5:
+                        versions['7'].append(tag)
 
-                # Remove empty version groups
-                versions = {k: v for k, v in versions.items() if v}
+            # Remove empty version groups
+            return {k: v for k, v in versions.items() if v}
 
-                self.set_cached_version(cache_key, versions)
-                return versions
-        except Exception as e:
-            print(f"Warning: Could not fetch latest Elasticsearch versions: {e}")
-            # Return hardcoded fallback
-            return ELASTICSEARCH_VERSIONS
+        # Hardcoded fallback: ELASTICSEARCH_VERSIONS
+        return self._cached_discovery('elasticsearch_versions', fetch, ELASTICSEARCH_VERSIONS,
+                                      "Elasticsearch versions")
 
-    def download_file(self, url, dest_path=None, expected_checksum=None, max_retries=3):
+    def download_file(self, url, dest_path=None, expected_checksum=None, max_retries=3,
+                      checksum_algorithm='sha256'):
         """Download a file with progress indication.
 
         The CDN in front of packages.axonops.com occasionally drops the
@@ -250,143 +2101,435 @@ class PackageDownloader:
         read as EOF and writes a truncated file, which then fails checksum
         verification (or, for unchecked files, is silently corrupt). We guard
         against that by comparing the bytes written to the advertised
-        Content-Length and retrying the whole download on any failure.
+        Content-Length and retrying on any failure.
+
+        Bytes are streamed into ``<dest>.part`` and only renamed over ``dest``
+        once complete and verified. When the server supports byte ranges, the
+        partial file is kept alongside a ``<dest>.part.json`` record of the
+        object's ETag/Last-Modified, and the next attempt — in this run or a
+        later one — resumes it with a ``Range`` request guarded by
+        ``If-Range``. If the upstream object changed, the server answers with
+        the full body and the download starts over from byte zero.
+
+        ``expected_checksum`` is a ``checksum_algorithm`` digest (sha256 by
+        default). It is computed incrementally as the bytes arrive, alongside
+        a sha256 that is kept in the digest index, so a fresh download is
+        never read back from disk just to verify it.
+
+        Without an ``expected_checksum`` an existing file is revalidated
+        instead: the ETag/Last-Modified it was downloaded with are sent as
+        ``If-None-Match``/``If-Modified-Since`` and a ``304`` keeps the file.
+        Any other answer is simply the new body, so a changed artifact costs
+        no extra round trip.
+
+        Every call appends a record to ``self.metrics`` with its outcome,
+        time to first byte, throughput, attempts, resumed bytes and the time
+        spent verifying digests (see write_metrics()).
         """
         if dest_path is None:
             dest_path = self.download_dir / os.path.basename(url)
+        metrics = {
+            'name': dest_path.name,
+            'url': url,
+            'host': urlsplit(url).hostname,
+            'outcome': 'failed',
+            'attempts': 0,
+            'ttfb_seconds': None,
+            'bytes': 0,
+            'bytes_resumed': 0,
+            'transfer_seconds': 0.0,
+            'verify_seconds': 0.0,
+        }
+        started = time.monotonic()
+        try:
+            result = self._download_file(url, dest_path, expected_checksum, max_retries,
+                                         checksum_algorithm, metrics)
+        except Exception as e:
+            metrics['error'] = str(e)
+            raise
+        finally:
+            metrics['seconds'] = round(time.monotonic() - started, 3)
+            metrics['retries'] = max(0, metrics['attempts'] - 1)
+            transfer = metrics['transfer_seconds']
+            metrics['throughput_bytes_per_second'] = round(metrics['bytes'] / transfer) if transfer else None
+            for key in ('ttfb_seconds', 'transfer_seconds', 'verify_seconds'):
+                if metrics[key] is not None:
+                    metrics[key] = round(metrics[key], 3)
+            with self._metrics_lock:
+                self.metrics.append(metrics)
+        return result
+
+    def _download_file(self, url, dest_path, expected_checksum, max_retries, checksum_algorithm, metrics):
+        """The body of download_file(); fills in ``metrics`` as it goes."""
+        part_path = dest_path.with_name(dest_path.name + PART_SUFFIX)
+        state_path = dest_path.with_name(dest_path.name + PART_STATE_SUFFIX)
 
         # Skip if already exists and checksum matches
         if dest_path.exists() and expected_checksum:
-            actual_checksum = self.calculate_checksum(dest_path)
-            if actual_checksum == expected_checksum:
-                print(f"✓ {dest_path.name} already downloaded and verified")
+            verify_started = time.monotonic()
+            actual_checksum = self.digest_index.lookup(dest_path, checksum_algorithm)
+            if actual_checksum is None:
+                actual_checksum = self.calculate_checksum(dest_path, checksum_algorithm)
+                self.digest_index.record(dest_path, {checksum_algorithm: actual_checksum})
+            metrics['verify_seconds'] += time.monotonic() - verify_started
+            if actual_checksum.lower() == expected_checksum.lower():
+                self._print(f"✓ {dest_path.name} already downloaded and verified")
+                metrics['outcome'] = 'verified'
                 return dest_path
 
-        print(f"Downloading {url}")
-        print(f"  → {dest_path}")
+        # Content another output tree already fetched is linked, not downloaded.
+        if self.store and (expected_checksum or not dest_path.exists()):
+            sha256 = self.store.resolve(url, checksum_algorithm, expected_checksum)
+            if sha256:
+                self.store.materialize(sha256, dest_path)
+                digests = {'sha256': sha256}
+                if expected_checksum:
+                    digests[checksum_algorithm] = expected_checksum.lower()
+                self.digest_index.record(dest_path, digests, source=self.store.source(url, sha256))
+                self._print(f"✓ {dest_path.name} linked from the artifact store")
+                metrics['outcome'] = 'linked'
+                return dest_path
 
-        headers = {"User-Agent": USER_AGENT}
+        conditional = {} if expected_checksum else self._conditional_headers(dest_path, url)
+        if conditional:
+            self._print(f"Checking {url} for changes")
+        else:
+            self._print(f"Downloading {url}", f"  → {dest_path}")
 
         last_error = None
         for attempt in range(1, max_retries + 1):
+            metrics['attempts'] = attempt
+            headers = {"User-Agent": USER_AGENT}
+            offset = self._resume_offset(url, part_path, state_path)
+            if offset:
+                state = self._read_part_state(state_path)
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = state['validator']
+            elif conditional:
+                headers.update(conditional)
             request = urllib.request.Request(url, headers=headers)
+            requested = time.monotonic()
             try:
-                with urllib.request.urlopen(request) as response:
-                    total_size = int(response.headers.get('Content-Length', 0))
+                with self.http.urlopen(request) as response:
+                    metrics['ttfb_seconds'] = time.monotonic() - requested
+                    if response.status == 304:
+                        self._print(f"✓ {dest_path.name} unchanged upstream, skipped")
+                        metrics['outcome'] = 'unchanged'
+                        return dest_path
+                    source = {
+                        'url': url,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                    }
+                    content_length = int(response.headers.get('Content-Length', 0))
+                    if offset and response.status == 206:
+                        if not self._content_range_matches(response, offset):
+                            self._discard_part(part_path, state_path)
+                            raise IOError(
+                                f"Unexpected Content-Range {response.headers.get('Content-Range')!r} "
+                                f"when resuming at byte {offset}"
+                            )
+                        mode = 'ab'
+                        metrics['bytes_resumed'] = offset
+                        self._print(f"  ↻ Resuming {dest_path.name} at byte {offset}")
+                    else:
+                        # Full body: either a fresh download, or If-Range
+                        # told us the upstream object changed underneath the
+                        # partial file.
+                        if offset:
+                            self._print(f"  ↻ {dest_path.name} changed upstream; restarting")
+                        offset = 0
+                        mode = 'wb'
+                    total_size = offset + content_length if content_length else 0
+                    self._write_part_state(state_path, url, response)
                     downloaded = 0
-                    block_size = 8192
-
-                    with open(dest_path, 'wb') as f:
-                        while True:
-                            buffer = response.read(block_size)
-                            if not buffer:
-                                break
-                            downloaded += len(buffer)
-                            f.write(buffer)
-
-                            if total_size > 0:
-                                percent = (downloaded / total_size) * 100
-                                bars = int(percent / 2)
-                                print(f"\r  Progress: [{'=' * bars}{' ' * (50-bars)}] {percent:.1f}%", end='', flush=True)
-                    print()  # New line after progress
+
+                    hashers = {algo: hashlib.new(algo) for algo in {'sha256', checksum_algorithm}}
+                    chunks = ChunkHasher()
+                    feeders = [*hashers.values(), chunks]
+                    hashing = 0.0
+                    if offset:
+                        # The resumed prefix is read once to seed the hashes;
+                        # everything after it is hashed straight off the wire.
+                        hash_started = time.monotonic()
+                        self._hash_file(part_path, feeders)
+                        hashing += time.monotonic() - hash_started
+
+                    buffer = bytearray(self.buffer_size)
+                    view = memoryview(buffer)
+                    transfer_started = last_render = time.monotonic()
+                    try:
+                        with open(part_path, mode) as f:
+                            while True:
+                                n = response.readinto(buffer)
+                                if not n:
+                                    break
+                                chunk = view[:n]
+                                downloaded += n
+                                f.write(chunk)
+                                hash_started = time.monotonic()
+                                for hasher in feeders:
+                                    hasher.update(chunk)
+                                now = time.monotonic()
+                                hashing += now - hash_started
+
+                                if total_size > 0 and self.show_progress and (
+                                        now - last_render >= PROGRESS_INTERVAL or offset + downloaded >= total_size):
+                                    last_render = now
+                                    percent = ((offset + downloaded) / total_size) * 100
+                                    bars = int(percent / 2)
+                                    print(f"\r  Progress: [{'=' * bars}{' ' * (50-bars)}] {percent:.1f}%", end='', flush=True)
+                    finally:
+                        # Attempts that fail mid-read still moved bytes; count them.
+                        metrics['bytes'] += downloaded
+                        metrics['transfer_seconds'] += time.monotonic() - transfer_started
+                        metrics['verify_seconds'] += hashing
+                    if self.show_progress:
+                        print()  # New line after progress
 
                 # Detect a truncated transfer: fewer bytes than advertised.
-                if total_size > 0 and downloaded != total_size:
+                if content_length > 0 and downloaded != content_length:
                     raise IOError(
-                        f"Incomplete download: got {downloaded} of {total_size} bytes"
+                        f"Incomplete download: got {offset + downloaded} of {total_size} bytes"
                     )
 
                 # Verify checksum if provided
+                digests = {algo: hasher.hexdigest() for algo, hasher in hashers.items()}
                 if expected_checksum:
-                    print("  Verifying checksum...")
-                    actual_checksum = self.calculate_checksum(dest_path)
+                    actual_checksum = digests[checksum_algorithm]
                     if actual_checksum.lower() != expected_checksum.lower():
+                        # A resumed file that fails verification can't be
+                        # trusted to resume again; start the next attempt clean.
+                        self._discard_part(part_path, state_path)
                         raise ValueError(
                             f"Checksum mismatch! Expected: {expected_checksum}, Got: {actual_checksum}"
                         )
-                    print("  ✓ Checksum verified")
-
+                    self._print(f"  ✓ {checksum_algorithm} checksum verified: {dest_path.name}")
+
+                metrics['outcome'] = 'downloaded'
+                os.replace(part_path, dest_path)
+                if state_path.exists():
+                    os.remove(state_path)
+                source['size'] = offset + downloaded
+                self.digest_index.record(dest_path, dict(digests, chunks=chunks.tree()),
+                                         downloaded_at=utc_now(), source=source)
+                if self.store:
+                    try:
+                        self.store.ingest(dest_path, digests, url, source)
+                    except OSError as e:
+                        self._print(f"  ⚠ Could not add {dest_path.name} to the artifact store: {e}")
                 return dest_path
 
             except urllib.error.HTTPError as e:
+                if e.code == 416 and offset:
+                    # The partial file is not a prefix of anything the server
+                    # has any more; drop it and retry from scratch.
+                    last_error = e
+                    self._discard_part(part_path, state_path)
+                    self._print(f"  ⚠ {dest_path.name}: stale partial download discarded — retrying...")
+                    continue
                 # HTTP errors (404 etc.) will not fix themselves on retry.
-                print(f"  ✗ HTTP Error {e.code}: {e.reason}")
-                if dest_path.exists():
-                    os.remove(dest_path)
+                self._print(f"  ✗ HTTP Error {e.code}: {e.reason} ({url})")
+                self._discard_part(part_path, state_path)
                 raise
             except Exception as e:
                 last_error = e
-                if dest_path.exists():
-                    os.remove(dest_path)
+                # Keep the partial file only if it can be resumed later.
+                if not state_path.exists() and part_path.exists():
+                    os.remove(part_path)
                 if attempt < max_retries:
-                    print(f"  ⚠ Attempt {attempt}/{max_retries} failed: {e} — retrying...")
+                    self._print(f"  ⚠ {dest_path.name}: attempt {attempt}/{max_retries} failed: {e} — retrying...")
                     time.sleep(2 * attempt)
                 else:
-                    print(f"  ✗ Error after {max_retries} attempts: {e}")
+                    self._print(f"  ✗ {dest_path.name}: error after {max_retries} attempts: {e}")
 
         raise last_error
 
+    def _read_part_state(self, state_path):
+        """Load the resume record for a ``.part`` file, or None."""
+        return read_json(state_path)
+
+    def _write_part_state(self, state_path, url, response):
+        """Record what is needed to resume the transfer behind ``response``.
+
+        Resuming is only safe when the server accepts byte ranges and gives
+        us a validator for If-Range. A strong ETag is preferred; weak ETags
+        are not allowed in If-Range, so Last-Modified is used instead. When
+        neither is usable any stale record is removed, which makes a failed
+        attempt discard its partial file.
+        """
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        ranges_ok = (response.status == 206 or
+                     response.headers.get('Accept-Ranges', '').lower() == 'bytes')
+        validator = etag if etag and not etag.startswith('W/') else last_modified
+        if not (ranges_ok and validator):
+            if state_path.exists():
+                os.remove(state_path)
+            return
+        with open(state_path, 'w') as f:
+            json.dump({
+                'url': url,
+                'etag': etag,
+                'last_modified': last_modified,
+                'validator': validator,
+            }, f)
+
+    def _resume_offset(self, url, part_path, state_path):
+        """Return how many bytes of ``part_path`` can be resumed (0 if none)."""
+        if not part_path.exists():
+            return 0
+        state = self._read_part_state(state_path)
+        if not state or state.get('url') != url or not state.get('validator'):
+            self._discard_part(part_path, state_path)
+            return 0
+        return part_path.stat().st_size
+
+    def _conditional_headers(self, dest_path, url):
+        """Return revalidation headers for an existing, unmodified ``dest_path``."""
+        source = self.digest_index.source(dest_path, url)
+        if not source or source.get('size') != dest_path.stat().st_size:
+            return {}
+        headers = {}
+        if source.get('etag'):
+            headers["If-None-Match"] = source['etag']
+        if source.get('last_modified'):
+            headers["If-Modified-Since"] = source['last_modified']
+        return headers
+
+    def _content_range_matches(self, response, offset):
+        """Return True if a 206 response starts exactly where our partial file ends."""
+        match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', response.headers.get('Content-Range', ''))
+        return bool(match) and int(match.group(1)) == offset
+
+    def _discard_part(self, part_path, state_path):
+        """Remove a partial download and its resume record."""
+        for path in (part_path, state_path):
+            if path.exists():
+                os.remove(path)
+
+    def _file_digests(self, file_path):
+        """Return the sha256 and chunk tree of ``file_path`` from one read pass."""
+        sha256 = hashlib.sha256()
+        chunks = ChunkHasher()
+        self._hash_file(file_path, [sha256, chunks])
+        return {'sha256': sha256.hexdigest(), 'chunks': chunks.tree()}
+
     def calculate_checksum(self, file_path, algorithm='sha256'):
         """Calculate checksum of a file."""
         hash_algo = hashlib.new(algorithm)
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                hash_algo.update(byte_block)
+        self._hash_file(file_path, [hash_algo])
         return hash_algo.hexdigest()
 
-    def download_with_checksum(self, base_url, filename, checksum_extensions=['.sha256', '.sha512', '.sha1']):
-        """Download a file and its checksum, then verify."""
-        file_url = urljoin(base_url, filename)
-        file_path = self.download_dir / filename
+    def _hash_file(self, file_path, hashers):
+        """Feed the contents of ``file_path`` to every hasher in one read pass."""
+        buffer = bytearray(self.buffer_size)
+        view = memoryview(buffer)
+        with open(file_path, "rb") as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                for hasher in hashers:
+                    hasher.update(view[:n])
 
-        # Try to find and download checksum
-        checksum_value = None
-        checksum_algo = None
+    def resolve_checksum(self, file_url, checksum_extensions=('.sha256', '.sha512', '.sha1')):
+        """Return the strongest ``(algorithm, digest)`` published next to ``file_url``.
 
-        for ext in checksum_extensions:
-            checksum_url = file_url + ext
+        Every sidecar in ``checksum_extensions`` is requested at once and
+        anything that does not parse as a hex digest of the right length
+        (an HTML error page, say) is ignored. Returns ``(None, None)`` when
+        no sidecar could be fetched; misses are not cached.
+        """
+        algorithms = [ext.lstrip('.') for ext in checksum_extensions]
+        cached = self.checksum_cache.get(file_url)
+        if cached and cached['algorithm'] in algorithms:
+            return cached['algorithm'], cached['digest']
+
+        def fetch(algorithm):
             try:
-                print(f"  Fetching checksum from {checksum_url}")
-                with urllib.request.urlopen(checksum_url) as response:
-                    checksum_content = response.read().decode('utf-8').strip()
-                    # Extract checksum (might be in format "checksum filename" or just "checksum")
-                    checksum_value = checksum_content.split()[0]
-                    checksum_algo = ext[1:]  # Remove the dot
-                    print(f"  Found {checksum_algo} checksum: {checksum_value}")
-                    break
-            except:
-                continue
+                with self.http.urlopen(f"{file_url}.{algorithm}", timeout=SIDECAR_TIMEOUT) as response:
+                    # Either "<digest>" or "<digest>  <file name>"
+                    fields = response.read().decode('utf-8').split()
+            except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError):
+                return None
+            digest = fields[0].lower() if fields else ''
+            if re.fullmatch(f"[0-9a-f]{{{hashlib.new(algorithm).digest_size * 2}}}", digest):
+                return digest
+            return None
+
+        with ThreadPoolExecutor(max_workers=len(algorithms)) as pool:
+            found = dict(zip(algorithms, pool.map(fetch, algorithms)))
+        for algorithm in sorted(algorithms, key=lambda a: CHECKSUM_STRENGTH.index(a)
+                                if a in CHECKSUM_STRENGTH else len(CHECKSUM_STRENGTH)):
+            if found[algorithm]:
+                entry = {'algorithm': algorithm, 'digest': found[algorithm]}
+                self.checksum_cache[file_url] = entry
+                update_json_locked(self.checksum_cache_path,
+                                   lambda cache: cache.__setitem__(file_url, entry))
+                return algorithm, found[algorithm]
+        return None, None
+
+    def download_with_checksum(self, base_url, filename, checksum_extensions=('.sha256', '.sha512', '.sha1'),
+                               mirror_key=None):
+        """Download a file and its checksum, then verify.
+
+        The checksum always comes from ``base_url``. With ``mirror_key`` (an
+        UPSTREAMS key) the file itself is fetched from the fastest mirror of
+        that upstream, failing over to the next one on any error.
+        """
+        file_url = urljoin(base_url, filename)
+        file_path = self.download_dir / filename
 
-        # Download the file
-        if checksum_value and checksum_algo == 'sha256':
-            self.download_file(file_url, file_path, checksum_value)
+        checksum_algo, checksum_value = self.resolve_checksum(file_url, checksum_extensions)
+        if checksum_value:
+            self._print(f"  Found {checksum_algo} checksum for {filename}: {checksum_value}")
         else:
-            # Download without verification if no sha256 found
-            self.download_file(file_url, file_path)
-            if checksum_value and checksum_algo:
-                # Verify with other algorithm
-                actual = self.calculate_checksum(file_path, checksum_algo)
-                if actual.lower() != checksum_value.lower():
-                    print(f"  ✗ {checksum_algo} checksum mismatch!")
-                    os.remove(file_path)
-                    raise ValueError("Checksum verification failed")
-                print(f"  ✓ {checksum_algo} checksum verified")
+            self._print(f"  ⚠ No checksum published for {filename}; it will not be verified")
+
+        # Download the file, verifying whichever digest was found as it streams in.
+        # Mirrors are only probed when there is actually something to fetch.
+        urls = [file_url]
+        if mirror_key and not self._already_verified(file_path, checksum_value, checksum_algo):
+            urls = self.mirrors.rank(mirror_key, file_url)
+        return self._download_from(urls, file_path, checksum_value, checksum_algo or 'sha256')
+
+    def _already_verified(self, file_path, expected_checksum, checksum_algorithm):
+        """Return True if ``file_path`` exists and matches ``expected_checksum``."""
+        if not (expected_checksum and file_path.exists()):
+            return False
+        actual_checksum = self.digest_index.lookup(file_path, checksum_algorithm)
+        if actual_checksum is None:
+            actual_checksum = self.calculate_checksum(file_path, checksum_algorithm)
+            self.digest_index.record(file_path, {checksum_algorithm: actual_checksum})
+        return actual_checksum.lower() == expected_checksum.lower()
+
+    def _download_from(self, urls, file_path, expected_checksum=None, checksum_algorithm='sha256'):
+        """download_file() from the first of ``urls`` that succeeds, failing over in order."""
+        for i, url in enumerate(urls):
+            try:
+                self.scheduler.use_host(url)
+                return self.download_file(url, file_path, expected_checksum, checksum_algorithm=checksum_algorithm)
+            except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError) as e:
+                if i == len(urls) - 1:
+                    raise
+                self._print(f"  ↪ {file_path.name}: {urlsplit(url).netloc} failed ({e}); "
+                            f"trying {urlsplit(urls[i + 1]).netloc}")
 
     def download_cassandra(self, version=None, non_interactive=False):
         """Download Apache Cassandra tarballs."""
         print("\n=== Apache Cassandra Downloads ===")
 
-        # Get latest versions
-        cassandra_versions = self.get_latest_cassandra_versions()
-
         if version:
             # Download specific version
             versions_to_download = [version]
         elif non_interactive:
             # In non-interactive mode, download latest of each major version
+            cassandra_versions = self._discovered_cassandra_versions()
             versions_to_download = [versions[0] for versions in cassandra_versions.values() if versions]
         else:
             # Interactive selection
+            cassandra_versions = self._discovered_cassandra_versions()
             print("\nAvailable Cassandra versions:")
             all_versions = []
             for major, versions in sorted(cassandra_versions.items(), reverse=True):
@@ -406,43 +2549,48 @@ class PackageDownloader:
                 versions_to_download = [all_versions[i] for i in indices]
 
         for version in versions_to_download:
-            print(f"\nDownloading Cassandra {version}...")
-            base_url = f"https://archive.apache.org/dist/cassandra/{version}/"
+            base_url = f"{self.upstreams['cassandra']}{version}/"
             filename = f"apache-cassandra-{version}-bin.tar.gz"
-            self.download_with_checksum(base_url, filename)
+            self.enqueue(f"Cassandra {version}", base_url + filename,
+                         partial(self.download_with_checksum, mirror_key='cassandra'), base_url, filename)
 
-    def download_elasticsearch(self, version=None, non_interactive=False):
-        """Download Elasticsearch tarballs."""
-        print("\n=== Elasticsearch Downloads ===")
+    def _discovered_cassandra_versions(self):
+        return self.discovered.get('cassandra') or self.get_latest_cassandra_versions()
 
-        # Get latest versions
-        elasticsearch_versions = self.get_latest_elasticsearch_versions()
+    def _discovered_elasticsearch_versions(self):
+        return self.discovered.get('elasticsearch') or self.get_latest_elasticsearch_versions()
 
-        platforms = {
-            "1": ("linux-x86_64", "Linux x64"),
-            "2": ("linux-aarch64", "Linux ARM64"),
-            "3": ("darwin-x86_64", "macOS x64"),
-            "4": ("darwin-aarch64", "macOS ARM64")
-        }
+    def download_elasticsearch(self, version=None, non_interactive=False, platforms=None):
+        """Download Elasticsearch tarballs.
 
-        # Select platform
-        if non_interactive:
-            platform, platform_name = platforms["1"]  # Default to Linux x64
-        else:
+        ``platforms`` is a list of PLATFORMS keys; every selected version is
+        queued once per platform. Without it, non-interactive runs fetch
+        DEFAULT_PLATFORM and interactive runs ask for one.
+        """
+        print("\n=== Elasticsearch Downloads ===")
+
+        # Select platform(s)
+        if not platforms and non_interactive:
+            platforms = [DEFAULT_PLATFORM]
+        elif not platforms:
             print("\nSelect platform:")
-            for key, (_, name) in platforms.items():
-                print(f"  {key}. {name}")
+            choices = list(PLATFORMS)
+            for i, platform in enumerate(choices, 1):
+                print(f"  {i}. {PLATFORMS[platform]['name']}")
             platform_choice = input("Platform (default: 1): ").strip() or "1"
-            platform, platform_name = platforms.get(platform_choice, platforms["1"])
+            index = int(platform_choice) - 1 if platform_choice.isdigit() else 0
+            platforms = [choices[index] if 0 <= index < len(choices) else DEFAULT_PLATFORM]
 
         if version:
             # Download specific version
             versions_to_download = [version]
         elif non_interactive:
             # In non-interactive mode, download latest of each major version
+            elasticsearch_versions = self._discovered_elasticsearch_versions()
             versions_to_download = [versions[0] for versions in elasticsearch_versions.values() if versions]
         else:
             # Interactive selection
+            elasticsearch_versions = self._discovered_elasticsearch_versions()
             print("\nAvailable Elasticsearch versions:")
             all_versions = []
             for major, versions in sorted(elasticsearch_versions.items(), reverse=True):
@@ -461,21 +2609,27 @@ class PackageDownloader:
                 indices = [int(x.strip())-1 for x in choice.split(',')]
                 versions_to_download = [all_versions[i] for i in indices]
 
+        base_url = self.upstreams['elasticsearch']
         for version in versions_to_download:
-            print(f"\nDownloading Elasticsearch {version} for {platform_name}...")
-            base_url = "https://artifacts.elastic.co/downloads/elasticsearch/"
-            filename = f"elasticsearch-{version}-{platform}.tar.gz"
-            self.download_with_checksum(base_url, filename, ['.sha512'])
-
-    def download_java(self, arch='x64'):
-        """Download Java distributions."""
+            for platform in platforms:
+                filename = f"elasticsearch-{version}-{platform}.tar.gz"
+                self.enqueue(f"Elasticsearch {version} ({PLATFORMS[platform]['name']})", base_url + filename,
+                             partial(self.download_with_checksum, mirror_key='elasticsearch'),
+                             base_url, filename, ('.sha512',))
+
+    def download_java(self, arches=('x64',)):
+        """Download Java distributions, one Zulu JDK 17 build per arch in ``arches``."""
         print("\n=== Java Downloads ===")
 
-        print(f"\nDownloading Azul Zulu JDK 17 for Linux {arch}...")
-        url = self.get_latest_zulu_java_17_url(arch)
-        filename = os.path.basename(url)
-        print(f"\n  URL: {url}")
-        self.download_file(url, self.download_dir / filename)
+        if not arches:
+            # --platforms named only macOS targets; Zulu is fetched for Linux only.
+            print("  ✗ No Linux platform selected (see --platforms); no Java distribution queued")
+            return
+        for arch in arches:
+            url = self.discovered.get(f'java_{arch}') or self.get_latest_zulu_java_17_url(arch)
+            filename = os.path.basename(url)
+            print(f"\n  Azul Zulu JDK 17 for Linux {arch}: {url}")
+            self.enqueue(f"Azul Zulu JDK 17 ({arch})", url, self.download_file, url, self.download_dir / filename)
 
     def _match_filter(self, name, patterns):
         """Decide whether ``name`` is wanted and which version is pinned.
@@ -502,14 +2656,16 @@ class PackageDownloader:
         """Return True if ``actual`` satisfies the ``pinned`` version.
 
         Accepts an exact match, or matches the upstream version portion of an
-        RPM ``ver-rel`` string (so ``--packages axon-agent=2.0.30`` matches the
-        ``2.0.30-1`` RPM as well as the ``2.0.30`` DEB).
+        RPM ``[epoch:]ver-rel`` string (so ``--packages axon-agent=2.0.30``
+        matches the ``2.0.30-1`` and ``1:2.0.30-1`` RPMs as well as the
+        ``2.0.30`` DEB).
         """
         if pinned is None:
             return True
         if actual == pinned:
             return True
-        if actual.split('-', 1)[0] == pinned:
+        actual = actual.rpartition(':')[2]
+        if actual == pinned or actual.split('-', 1)[0] == pinned:
             return True
         return False
 
@@ -544,60 +2700,136 @@ class PackageDownloader:
             elif pkg_type == "rpm":
                 self._download_axonops_rpm(package_filter)
 
+    def fetch_metadata(self, url, cache_name):
+        """Fetch repository metadata through the on-disk metadata cache.
+
+        The body is kept in ``<state dir>/metadata/<cache_name>`` with its
+        ETag, Last-Modified and sha256 in a ``.json`` record beside it. A
+        cached copy is revalidated with If-None-Match/If-Modified-Since, so an
+        unchanged index costs one empty 304 round-trip.
+
+        Returns ``(path, record)``; ``record['sha256']`` identifies the
+        content, which callers use to key anything derived from it.
+        """
+        cache_dir = self.state_dir / 'metadata'
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        path = cache_dir / cache_name
+        record_path = cache_dir / f"{cache_name}.json"
+        record = read_json(record_path) if path.exists() else None
+
+        headers = {"User-Agent": USER_AGENT}
+        if record and record.get('url') == url:
+            if record.get('etag'):
+                headers['If-None-Match'] = record['etag']
+            if record.get('last_modified'):
+                headers['If-Modified-Since'] = record['last_modified']
+        else:
+            record = None
+
+        with self.http.urlopen(urllib.request.Request(url, headers=headers)) as response:
+            if response.status == 304 and record:
+                return path, record
+            hasher = hashlib.sha256()
+            tmp_path = path.with_name(path.name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                while True:
+                    chunk = response.read(self.buffer_size)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    f.write(chunk)
+            record = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'sha256': hasher.hexdigest(),
+            }
+        os.replace(tmp_path, path)
+        self._save_json(record_path, record)
+        return path, record
+
+    def _save_json(self, path, data):
+        """Atomically write ``data`` as JSON to ``path``."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _cached_parse(self, cache_name, source_id, parse):
+        """Return ``parse()``'s result, reusing it while ``source_id`` is unchanged.
+
+        Parsed package lists are stored next to the raw metadata so an index
+        that has not changed upstream is never parsed twice.
+        """
+        parsed_path = self.state_dir / 'metadata' / f"{cache_name}.parsed.json"
+        cached = read_json(parsed_path)
+        if (cached and cached.get('source') == source_id
+                and cached.get('format') == PARSED_METADATA_FORMAT):
+            return cached['packages'], False
+        packages = parse()
+        self._save_json(parsed_path, {'source': source_id, 'format': PARSED_METADATA_FORMAT,
+                                      'packages': packages})
+        return packages, True
+
     def _download_axonops_deb(self, package_filter=None):
         """Download AxonOps Debian packages.
 
         Discovers every ``axon-*`` package present in the apt repository (across
         the ``all``, ``amd64`` and ``arm64`` binary indexes) and downloads the
         latest version of each, optionally restricted by ``package_filter``
-        (list of shell-style globs). The apt index is a plain, uncompressed
-        ``Packages`` file — there is no ``Packages.gz``.
+        (list of shell-style globs).
+
+        The suite's ``Release`` file is revalidated first; it names the
+        smallest index variant available (``Packages.xz``, ``Packages.gz`` or
+        plain ``Packages``) and its sha256, which both verifies the stream and
+        tells us whether the cached package list is still current. Without a
+        usable Release file, the plain ``Packages`` index is revalidated
+        directly.
         """
-        print("\nDownloading AxonOps DEB packages...")
-        base_url = "https://packages.axonops.com/apt"
+        print("\nResolving AxonOps DEB packages...")
+        base_url = self.upstreams['axonops_apt']
+        dists_url = f"{base_url}/dists/{AXONOPS_APT_SUITE}"
 
-        # package_name -> (version, filename, sha256) for the newest version seen
+        try:
+            release = self._fetch_apt_release(dists_url)
+        except Exception as e:
+            print(f"  ⚠ Could not read apt Release file ({e}); falling back to plain Packages indexes")
+            release = {}
+
+        # package_name -> (version, filename, sha256, size) for the newest version seen
         latest = {}
 
         for arch in AXONOPS_APT_ARCHITECTURES:
-            packages_url = (
-                f"{base_url}/dists/{AXONOPS_APT_SUITE}/{AXONOPS_APT_COMPONENT}"
-                f"/binary-{arch}/Packages"
-            )
-            packages_path = self.download_dir / f"Packages_{arch}"
+            index_dir = f"{AXONOPS_APT_COMPONENT}/binary-{arch}"
+            cache_name = f"apt-{AXONOPS_APT_SUITE}-{AXONOPS_APT_COMPONENT}-{arch}-Packages"
 
             try:
-                self.download_file(packages_url, packages_path)
-
-                with open(packages_path, 'r') as f:
-                    stanzas = f.read().split('\n\n')
-
-                for pkg in stanzas:
-                    name_match = re.search(r'^Package: (.+)$', pkg, re.MULTILINE)
-                    if not name_match:
-                        continue
-                    package_name = name_match.group(1).strip()
+                for variant, decompress in APT_INDEX_VARIANTS:
+                    sha256 = release.get(f"{index_dir}/{variant}")
+                    if sha256:
+                        index_url = f"{dists_url}/{index_dir}/{variant}"
+                        packages, parsed = self._cached_parse(
+                            cache_name, f"sha256:{sha256}",
+                            lambda: self._stream_metadata(index_url, 'sha256', sha256, decompress,
+                                                          self._iter_apt_stream))
+                        break
+                else:
+                    packages_url = f"{dists_url}/{index_dir}/Packages"
+                    packages_path, record = self.fetch_metadata(packages_url, cache_name)
+                    packages, parsed = self._cached_parse(
+                        cache_name, record['sha256'], lambda: self._parse_apt_packages(packages_path))
+                if not parsed:
+                    print(f"  apt index for {arch} unchanged, using cached package list")
+
+                for package_name, version, filename, sha256, size in packages:
                     matched, pinned = self._match_filter(package_name, package_filter)
-                    if not matched:
-                        continue
-
-                    version_match = re.search(r'^Version: (.+)$', pkg, re.MULTILINE)
-                    filename_match = re.search(r'^Filename: (.+)$', pkg, re.MULTILINE)
-                    sha256_match = re.search(r'^SHA256: (.+)$', pkg, re.MULTILINE)
-                    if not (version_match and filename_match):
+                    if not matched or not self._version_matches(version, pinned):
                         continue
-
-                    version = version_match.group(1).strip()
-                    if not self._version_matches(version, pinned):
-                        continue
-                    filename = filename_match.group(1).strip()
-                    sha256 = sha256_match.group(1).strip() if sha256_match else None
-
                     current = latest.get(package_name)
-                    if current is None or self._compare_versions(version, current[0]) > 0:
-                        latest[package_name] = (version, filename, sha256)
-
-                os.remove(packages_path)
+                    if current is None or version_key(version, 'deb') > version_key(current[0], 'deb'):
+                        latest[package_name] = (version, filename, sha256, size)
 
             except Exception as e:
                 print(f"  ✗ Error reading apt index for {arch}: {e}")
@@ -610,14 +2842,100 @@ class PackageDownloader:
             return
 
         for package_name in sorted(latest):
-            version, filename, sha256 = latest[package_name]
+            version, filename, sha256, size = latest[package_name]
+            package_url = f"{base_url}/{filename}"
+            package_file = self.download_dir / os.path.basename(filename)
+            self.enqueue(f"{package_name} {version} (deb)", package_url,
+                         self.download_file, package_url, package_file, sha256, size=size, sha256=sha256)
+
+    def _fetch_apt_release(self, dists_url):
+        """Return ``{path: sha256}`` for the index files listed in the suite's Release."""
+        release_path, _ = self.fetch_metadata(f"{dists_url}/Release", f"apt-{AXONOPS_APT_SUITE}-Release")
+        entries = {}
+        in_sha256 = False
+        with open(release_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if not line.startswith((' ', '\t')):
+                    in_sha256 = line.split(':', 1)[0] == 'SHA256'
+                    continue
+                if in_sha256:
+                    fields = line.split()
+                    if len(fields) == 3:
+                        entries[fields[2]] = fields[0]
+        return entries
+
+    def _parse_apt_packages(self, packages_path):
+        """Return ``[name, version, filename, sha256, size]`` for each axon-* stanza."""
+        with open(packages_path, 'r', encoding='utf-8', errors='replace') as f:
+            return list(self._iter_apt_packages(f))
+
+    def _iter_apt_stream(self, stream):
+        """Like ``_iter_apt_packages`` for a binary (possibly decompressed) stream."""
+        return self._iter_apt_packages(io.TextIOWrapper(stream, encoding='utf-8', errors='replace'))
+
+    def _iter_apt_packages(self, lines):
+        """Yield ``[name, version, filename, sha256, size]`` for each axon-* stanza.
+
+        A single pass over deb822 ``lines``: only the five fields we need are
+        kept, continuation lines are ignored, and once a stanza's ``Package:``
+        line shows it is not an axon-* package the rest of it is skipped.
+        """
+        fields = {}
+        wanted = True
+        for line in lines:
+            if not line.strip():
+                if wanted and 'Package' in fields and 'Version' in fields and 'Filename' in fields:
+                    yield self._apt_record(fields)
+                fields = {}
+                wanted = True
+                continue
+            if not wanted or line[0] in ' \t':
+                continue
+            key, _, value = line.partition(':')
+            if key == 'Package':
+                value = value.strip()
+                wanted = self._match_filter(value, None)[0]
+                fields[key] = value
+            elif key in ('Version', 'Filename', 'SHA256', 'Size'):
+                fields[key] = value.strip()
+        if wanted and 'Package' in fields and 'Version' in fields and 'Filename' in fields:
+            yield self._apt_record(fields)
+
+    def _apt_record(self, fields):
+        size = fields.get('Size')
+        return [fields['Package'], fields['Version'], fields['Filename'], fields.get('SHA256'),
+                int(size) if size and size.isdigit() else None]
+
+    def _stream_metadata(self, url, algorithm, expected, decompress, parse, max_retries=3):
+        """Fetch a metadata file and parse it as it streams in.
+
+        ``decompress`` wraps the raw stream (``None`` for uncompressed data)
+        and ``parse`` turns the decoded stream into records. The raw bytes are
+        hashed on the way through and compared with ``expected``, so nothing
+        is written to disk and a corrupt or truncated stream is rejected (and
+        retried) rather than cached.
+        """
+        last_error = None
+        for attempt in range(1, max_retries + 1):
             try:
-                package_url = f"{base_url}/{filename}"
-                package_file = self.download_dir / os.path.basename(filename)
-                self.download_file(package_url, package_file, sha256)
-                print(f"  ✓ Downloaded {package_name} {version}")
+                with self.http.urlopen(url) as response:
+                    reader = HashingReader(response, algorithm)
+                    stream = decompress(reader) if decompress else io.BufferedReader(reader)
+                    records = list(parse(stream))
+                    reader.drain()
+                if expected and reader.hexdigest().lower() != expected.lower():
+                    raise ValueError(
+                        f"{os.path.basename(url)} {algorithm} mismatch! Expected: {expected}, Got: {reader.hexdigest()}"
+                    )
+                return records
+            except urllib.error.HTTPError:
+                raise
             except Exception as e:
-                print(f"  ✗ Error downloading {package_name} {version}: {e}")
+                last_error = e
+                if attempt < max_retries:
+                    print(f"  ⚠ {os.path.basename(url)}: attempt {attempt}/{max_retries} failed: {e} — retrying...")
+                    time.sleep(2 * attempt)
+        raise last_error
 
     def _download_axonops_rpm(self, package_filter=None):
         """Download AxonOps RPM packages.
@@ -625,16 +2943,19 @@ class PackageDownloader:
         Discovers every ``axon-*`` package in the yum repository and downloads
         the latest version of each (per architecture), optionally restricted by
         ``package_filter`` (list of shell-style globs).
+
+        ``repomd.xml`` is revalidated through the metadata cache and the
+        ``primary`` checksum it lists decides whether the cached package list
+        is still current, so ``primary.xml.gz`` is only fetched and parsed when
+        it actually changed upstream.
         """
-        print("\nDownloading AxonOps RPM packages...")
-        base_url = "https://packages.axonops.com/yum"
+        print("\nResolving AxonOps RPM packages...")
+        base_url = self.upstreams['axonops_yum']
 
-        # Download repomd.xml
         repomd_url = f"{base_url}/repodata/repomd.xml"
-        repomd_path = self.download_dir / "repomd.xml"
 
         try:
-            self.download_file(repomd_url, repomd_path)
+            repomd_path, _ = self.fetch_metadata(repomd_url, "yum-repomd.xml")
 
             # Parse repomd.xml to find primary.xml location
             tree = ET.parse(repomd_path)
@@ -642,69 +2963,40 @@ class PackageDownloader:
             ns = {'repo': 'http://linux.duke.edu/metadata/repo'}
 
             primary_location = None
+            primary_checksum = None
             for data in root.findall('repo:data', ns):
                 if data.get('type') == 'primary':
                     location = data.find('repo:location', ns)
+                    checksum = data.find('repo:checksum', ns)
                     if location is not None:
                         primary_location = location.get('href')
+                        if checksum is not None and checksum.text:
+                            primary_checksum = (checksum.get('type', 'sha256'), checksum.text.strip())
                         break
 
             if not primary_location:
                 raise ValueError("Could not find primary.xml location in repomd.xml")
 
-            # Download primary.xml
             primary_url = f"{base_url}/{primary_location}"
-            primary_gz_path = self.download_dir / "primary.xml.gz"
-            primary_path = self.download_dir / "primary.xml"
-
-            self.download_file(primary_url, primary_gz_path)
-
-            # Extract primary.xml.gz
-            with gzip.open(primary_gz_path, 'rb') as f_in:
-                with open(primary_path, 'wb') as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-
-            # Parse primary.xml for packages
-            tree = ET.parse(primary_path)
-            root = tree.getroot()
-            ns = {'common': 'http://linux.duke.edu/metadata/common'}
+            source_id = ':'.join(primary_checksum) if primary_checksum else primary_location
+            packages, parsed = self._cached_parse(
+                "yum-primary", source_id,
+                lambda: self._fetch_rpm_primary(primary_url, primary_checksum))
+            if not parsed:
+                print("  yum primary metadata unchanged, using cached package list")
 
             # Discover the newest version of every axon-* package, keyed by
             # (name, arch) so x86_64 and aarch64 builds are both kept.
             latest = {}
 
-            for package in root.findall('common:package', ns):
-                name_elem = package.find('common:name', ns)
-                if name_elem is None or name_elem.text is None:
-                    continue
-                package_name = name_elem.text
+            for package_name, arch, version, location, checksum, size in packages:
                 matched, pinned = self._match_filter(package_name, package_filter)
-                if not matched:
-                    continue
-
-                arch_elem = package.find('common:arch', ns)
-                version_elem = package.find('common:version', ns)
-                location_elem = package.find('common:location', ns)
-                checksum_elem = package.find('common:checksum', ns)
-
-                if version_elem is None or location_elem is None:
+                if not matched or not self._version_matches(version, pinned):
                     continue
-
-                arch = arch_elem.text if arch_elem is not None else 'noarch'
-                version = f"{version_elem.get('ver')}-{version_elem.get('rel')}"
-                if not self._version_matches(version, pinned):
-                    continue
-                location = location_elem.get('href')
-                checksum = (
-                    checksum_elem.text
-                    if checksum_elem is not None and checksum_elem.get('type') == 'sha256'
-                    else None
-                )
-
                 key = (package_name, arch)
                 current = latest.get(key)
-                if current is None or self._compare_versions(version, current[0]) > 0:
-                    latest[key] = (version, location, checksum)
+                if current is None or version_key(version) > version_key(current[0]):
+                    latest[key] = (version, location, checksum, size)
 
             # The Cassandra/DSE/Kafka java-agent packages are now shipped as
             # `noarch` but the repo still carries obsolete `x86_64` builds of
@@ -718,12 +3010,6 @@ class PackageDownloader:
                 if a == 'noarch' or n not in names_with_noarch
             }
 
-            # Cleanup metadata before downloading packages so a package-download
-            # failure doesn't leave metadata behind.
-            os.remove(repomd_path)
-            os.remove(primary_gz_path)
-            os.remove(primary_path)
-
             if not latest:
                 if package_filter:
                     print(f"  ✗ No packages matched {package_filter} in the yum repository")
@@ -732,63 +3018,634 @@ class PackageDownloader:
                 return
 
             for (package_name, arch) in sorted(latest):
-                version, location, checksum = latest[(package_name, arch)]
-                try:
-                    package_url = f"{base_url}/{location}"
-                    package_file = self.download_dir / os.path.basename(location)
-                    self.download_file(package_url, package_file, checksum)
-                    print(f"  ✓ Downloaded {package_name} {version} ({arch})")
-                except Exception as e:
-                    print(f"  ✗ Error downloading {package_name} {version} ({arch}): {e}")
+                version, location, checksum, size = latest[(package_name, arch)]
+                package_url = f"{base_url}/{location}"
+                package_file = self.download_dir / os.path.basename(location)
+                self.enqueue(f"{package_name} {version} ({arch})", package_url,
+                             self.download_file, package_url, package_file, checksum, size=size,
+                             sha256=checksum)
 
         except Exception as e:
             print(f"  ✗ Error downloading RPM packages: {e}")
 
-    def _compare_versions(self, version1, version2):
-        """Compare two version strings."""
-        def version_key(version):
-            parts = []
-            for part in re.split(r'[\.-]', version):
-                if part.isdigit():
-                    parts.append(int(part))
-                else:
-                    parts.append(part)
-            return parts
+    def _fetch_rpm_primary(self, primary_url, primary_checksum):
+        """Stream and parse ``primary.xml.gz`` straight off the wire.
+
+        Returns ``[name, arch, version, location, sha256, size]`` for every axon-*
+        package, verified against the checksum from repomd.xml.
+        """
+        algorithm, expected = primary_checksum if primary_checksum else ('sha256', None)
+        return self._stream_metadata(primary_url, algorithm, expected,
+                                     lambda fileobj: gzip.GzipFile(fileobj=fileobj),
+                                     self._iter_primary_packages)
 
-        v1_parts = version_key(version1)
-        v2_parts = version_key(version2)
+    def _iter_primary_packages(self, stream):
+        """Yield ``[name, arch, version, location, sha256, size]`` from a primary.xml stream.
 
-        for i in range(max(len(v1_parts), len(v2_parts))):
-            v1_part = v1_parts[i] if i < len(v1_parts) else 0
-            v2_part = v2_parts[i] if i < len(v2_parts) else 0
+        ``version`` is ``ver-rel``, prefixed with ``epoch:`` when the epoch is
+        non-zero so it orders correctly under :class:`VersionKey`.
 
-            if v1_part < v2_part:
-                return -1
-            elif v1_part > v2_part:
-                return 1
+        Uses ``iterparse`` so only one ``<package>`` element is materialised
+        at a time: each is matched against the axon-* prefix as soon as it is
+        complete and then cleared, keeping memory flat however large the
+        repository grows.
+        """
+        ns = '{http://linux.duke.edu/metadata/common}'
+        package_tag = f"{ns}package"
+        root = None
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            if root is None:
+                root = elem
+                continue
+            if event != 'end' or elem.tag != package_tag:
+                continue
 
-        return 0
+            package_name = elem.findtext(f"{ns}name")
+            if package_name and self._match_filter(package_name, None)[0]:
+                version_elem = elem.find(f"{ns}version")
+                location_elem = elem.find(f"{ns}location")
+                checksum_elem = elem.find(f"{ns}checksum")
+                size_elem = elem.find(f"{ns}size")
+                size = size_elem.get('package') if size_elem is not None else None
+                if version_elem is not None and location_elem is not None:
+                    version = f"{version_elem.get('ver')}-{version_elem.get('rel')}"
+                    epoch = version_elem.get('epoch')
+                    if epoch and epoch != '0':
+                        version = f"{epoch}:{version}"
+                    yield [
+                        package_name,
+                        elem.findtext(f"{ns}arch") or 'noarch',
+                        version,
+                        location_elem.get('href'),
+                        checksum_elem.text
+                        if checksum_elem is not None and checksum_elem.get('type') == 'sha256'
+                        else None,
+                        int(size) if size and size.isdigit() else None,
+                    ]
+
+            elem.clear()
+            root.clear()
 
     def create_manifest(self):
-        """Create a manifest of downloaded files."""
+        """Create a manifest of downloaded files.
+
+        Digests come from the digest index whenever a file's size, mtime and
+        inode are unchanged since it was last hashed, so only new or modified
+        files are read. Those are hashed in parallel, one file per core.
+        Files larger than one MERKLE_CHUNK_SIZE chunk also list their chunk
+        hashes and Merkle root, and downloaded files their source URL, for
+        --verify/--repair.
+        """
         manifest = {
-            "download_date": str(Path(__file__).stat().st_mtime),
+            "download_date": utc_now(),
             "files": []
         }
 
+        files = []
         for file in sorted(self.download_dir.glob("*")):
+            if file.name.endswith((PART_SUFFIX, PART_STATE_SUFFIX)):
+                continue
             if file.is_file() and file.name not in ["manifest.json", "Packages_amd64", "Packages_arm64", "Packages_all"]:
-                manifest["files"].append({
-                    "name": file.name,
-                    "size": file.stat().st_size,
-                    "sha256": self.calculate_checksum(file)
-                })
+                files.append(file)
+
+        unhashed = [file for file in files if self.digest_index.lookup(file) is None
+                    or self.digest_index.lookup(file, 'chunks') is None]
+        if unhashed:
+            print(f"\nHashing {len(unhashed)} new or changed file(s) for the manifest...")
+            with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+                for file, digests in zip(unhashed, pool.map(self._file_digests, unhashed)):
+                    self.digest_index.record(file, digests)
+
+        for file in files:
+            stat = file.stat()
+            entry = self.digest_index.entry(file) or {}
+            record = {
+                "name": file.name,
+                **(artifact_identity(file.name) or {}),
+                "size": stat.st_size,
+                "sha256": self.digest_index.lookup(file),
+                # Files that predate the index (or were copied in by hand)
+                # have no recorded download time; their mtime is the best
+                # available approximation.
+                "downloaded_at": entry.get('downloaded_at') or datetime.fromtimestamp(
+                    stat.st_mtime, timezone.utc).isoformat(timespec='seconds'),
+            }
+            if entry.get('source', {}).get('url'):
+                record["url"] = entry['source']['url']
+            chunks = self.digest_index.lookup(file, 'chunks')
+            if len(chunks['hashes']) > 1:
+                record["chunks"] = chunks
+            manifest["files"].append(record)
 
         manifest_path = self.download_dir / "manifest.json"
         with open(manifest_path, "w") as f:
             json.dump(manifest, f, indent=2)
 
         print(f"\n✓ Manifest created: {manifest_path}")
+        return manifest
+
+    def bundle(self, bundle_path, manifest=None):
+        """Pack every file in ``manifest``, plus manifest.json, into one archive.
+
+        Members are streamed into the archive one after another, each
+        compressed on its own (see BUNDLE_MAGIC), and checked against the
+        manifest's sha256 on the way in. The random-access index and footer
+        are written last and the archive is renamed into place only once
+        complete. Returns the index.
+        """
+        if manifest is None:
+            manifest = read_json(self.download_dir / "manifest.json") or self.create_manifest()
+        bundle_path = Path(bundle_path)
+        part_path = bundle_path.with_name(bundle_path.name + PART_SUFFIX)
+        entries = manifest['files'] + [{'name': 'manifest.json', 'sha256': None}]
+        print(f"\nBundling {len(entries)} file(s) into {bundle_path}...")
+
+        members = []
+        buffer = bytearray(self.buffer_size)
+        view = memoryview(buffer)
+        with open(part_path, 'wb') as out:
+            out.write(BUNDLE_MAGIC)
+            for entry in entries:
+                name = entry['name']
+                compression = 'none' if name.endswith(BUNDLE_STORED_SUFFIXES) else 'xz'
+                compressor = lzma.LZMACompressor() if compression == 'xz' else None
+                sha256 = hashlib.sha256()
+                offset = out.tell()
+                size = 0
+                with open(self.download_dir / name, 'rb') as f:
+                    while True:
+                        n = f.readinto(buffer)
+                        if not n:
+                            break
+                        chunk = view[:n]
+                        sha256.update(chunk)
+                        size += n
+                        out.write(compressor.compress(chunk) if compressor else chunk)
+                if compressor:
+                    out.write(compressor.flush())
+                digest = sha256.hexdigest()
+                if entry['sha256'] and digest != entry['sha256']:
+                    out.close()
+                    part_path.unlink()
+                    raise ValueError(f"{name} no longer matches manifest.json; re-run the download first")
+                members.append({
+                    'name': name,
+                    'offset': offset,
+                    'length': out.tell() - offset,
+                    'size': size,
+                    'compression': compression,
+                    'sha256': digest,
+                })
+
+            index = {'format': 1, 'created': utc_now(), 'members': members}
+            index_offset = out.tell()
+            index_data = json.dumps(index).encode('utf-8')
+            out.write(index_data)
+            out.write(BUNDLE_FOOTER.pack(BUNDLE_MAGIC, index_offset, len(index_data)))
+        os.replace(part_path, bundle_path)
+
+        total = sum(member['size'] for member in members)
+        print(f"✓ Bundled {len(members)} file(s), {format_size(total)} → "
+              f"{format_size(bundle_path.stat().st_size)}: {bundle_path}")
+        return index
+
+    def unbundle(self, bundle_path, only=None):
+        """Extract members of a --bundle archive into the download directory.
+
+        ``only`` is an optional list of file-name globs; other members are
+        skipped without being read. Each member is located through the
+        trailing index, decompressed as it streams out and verified against
+        its sha256 before it is renamed into place. Files that are already
+        present and verified are left alone. Returns the number of members
+        that failed verification.
+        """
+        with open(bundle_path, 'rb') as f:
+            index = read_bundle_index(f)
+            members = index['members']
+            if only:
+                for pattern in only:
+                    if not any(fnmatch.fnmatch(member['name'], pattern) for member in members):
+                        print(f"  ⚠ Nothing in the bundle matches {pattern!r}")
+                members = [member for member in members
+                           if any(fnmatch.fnmatch(member['name'], pattern) for pattern in only)]
+            print(f"\nExtracting {len(members)} of {len(index['members'])} file(s) "
+                  f"from {bundle_path} into {self.download_dir}...")
+
+            failures = 0
+            for member in members:
+                name = member['name']
+                dest_path = self.download_dir / name
+                if dest_path.exists() and self.digest_index.lookup(dest_path) == member['sha256']:
+                    print(f"✓ {name} already present and verified")
+                    continue
+                try:
+                    digests = self._extract_member(f, member, dest_path)
+                except (OSError, lzma.LZMAError, ValueError) as e:
+                    print(f"  ✗ {name}: {e}")
+                    failures += 1
+                    continue
+                self.digest_index.record(dest_path, digests)
+                print(f"  ✓ {name} extracted and verified ({format_size(member['size'])})")
+        self.digest_index.save()
+        return failures
+
+    def _extract_member(self, f, member, dest_path):
+        """Stream one bundle member into ``dest_path``; returns its verified digests."""
+        name = member['name']
+        if '/' in name or '\\' in name or name in ('', '.', '..'):
+            raise ValueError(f"refusing to extract unsafe member name {name!r}")
+        part_path = dest_path.with_name(dest_path.name + PART_SUFFIX)
+        decompressor = lzma.LZMADecompressor() if member['compression'] == 'xz' else None
+        sha256 = hashlib.sha256()
+        chunks = ChunkHasher()
+        f.seek(member['offset'])
+        remaining = member['length']
+        with open(part_path, 'wb') as out:
+            while remaining:
+                chunk = f.read(min(self.buffer_size, remaining))
+                if not chunk:
+                    raise ValueError("bundle is truncated")
+                remaining -= len(chunk)
+                data = decompressor.decompress(chunk) if decompressor else chunk
+                sha256.update(data)
+                chunks.update(data)
+                out.write(data)
+        digest = sha256.hexdigest()
+        if digest != member['sha256']:
+            part_path.unlink()
+            raise ValueError(f"sha256 mismatch! Expected: {member['sha256']}, Got: {digest}")
+        os.replace(part_path, dest_path)
+        return {'sha256': digest, 'chunks': chunks.tree()}
+
+    def verify(self, repair=False, repair_from=None):
+        """Check every file in manifest.json chunk by chunk; optionally repair.
+
+        Each file is re-read in full, however recently it was indexed, and
+        its chunk hashes compared with the manifest to name the damaged
+        byte ranges. With ``repair``, only those ranges are fetched again,
+        from ``repair_from`` (a base URL such as a --serve mirror) first and
+        then from the URL the file was downloaded from, and every chunk is
+        checked before it is written. Files without chunk hashes are
+        downloaded again in full. Returns the number of files still bad.
+        """
+        manifest = read_json(self.download_dir / "manifest.json")
+        if not manifest:
+            raise ValueError(f"no manifest.json in {self.download_dir} to verify against")
+        entries = manifest['files']
+        print(f"\nVerifying {len(entries)} file(s) in {self.download_dir}...")
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            damaged = [result for result in pool.map(self._verify_entry, entries) if result]
+
+        still_bad = 0
+        for entry, bad_chunks in damaged:
+            if not repair or not self._repair_entry(entry, bad_chunks, repair_from):
+                still_bad += 1
+        self.digest_index.save()
+        if not damaged:
+            print(f"✓ All {len(entries)} file(s) verified")
+        return still_bad
+
+    def _verify_entry(self, entry):
+        """Return ``(entry, bad chunk indexes)`` if the file is damaged, else None."""
+        path = self.download_dir / entry['name']
+        if not path.exists():
+            self._print(f"  ✗ {entry['name']}: missing")
+            return (entry, None)
+        digests = self._file_digests(path)
+        if digests['sha256'] == entry['sha256']:
+            self.digest_index.record(path, digests)
+            return None
+        expected = entry.get('chunks')
+        if not expected or expected['chunk_size'] != MERKLE_CHUNK_SIZE:
+            self._print(f"  ✗ {entry['name']}: sha256 mismatch")
+            return (entry, None)
+        actual = digests['chunks']['hashes']
+        bad = [i for i, digest in enumerate(expected['hashes'])
+               if i >= len(actual) or actual[i] != digest]
+        self._print(f"  ✗ {entry['name']}: {len(bad)} of {len(expected['hashes'])} chunk(s) damaged")
+        return (entry, bad)
+
+    def _repair_entry(self, entry, bad_chunks, repair_from):
+        """Re-fetch the damaged chunks of one file (all of it without chunk hashes); True once it verifies."""
+        name = entry['name']
+        path = self.download_dir / name
+        urls = [url for url in (repair_from and urljoin(repair_from, quote(name)), entry.get('url')) if url]
+        if not urls:
+            self._print(f"  ✗ {name}: no URL to repair it from (use --repair-from)")
+            return False
+        # The damaged content still carries its old, good digest in the index
+        # (a flipped bit leaves size, mtime and inode alone); forget it so
+        # nothing downstream trusts it.
+        self.digest_index.forget(path)
+        if bad_chunks is None:
+            fetched = entry['size'] if self._refetch(urls, path, entry['sha256']) else None
+        else:
+            fetched = self._patch_chunks(urls, path, entry, bad_chunks)
+        if fetched is None:
+            return False
+
+        digests = self._file_digests(path)
+        if digests['sha256'] != entry['sha256']:
+            self._print(f"  ✗ {name}: still does not match manifest.json after repair")
+            return False
+        self.digest_index.record(path, digests)
+        self._print(f"  ✓ {name} repaired: re-fetched {format_size(fetched)} of {format_size(entry['size'])}")
+        return True
+
+    def _refetch(self, urls, path, sha256):
+        """Download a damaged file without chunk hashes again, in full."""
+        # The store may hold the very object that is damaged (hardlinked
+        # into this tree), so bypass it; the new file replaces the link.
+        store, self.store = self.store, None
+        try:
+            for url in urls:
+                try:
+                    self.download_file(url, path, sha256)
+                    return True
+                except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError) as e:
+                    self._print(f"  ⚠ {path.name}: re-download from {urlsplit(url).netloc} failed: {e}")
+        finally:
+            self.store = store
+        self._print(f"  ✗ {path.name}: could not re-download it")
+        return False
+
+    def _patch_chunks(self, urls, path, entry, bad_chunks):
+        """Re-fetch ``bad_chunks`` of ``path`` in place; returns the bytes fetched, or None on failure."""
+        name = entry['name']
+        # The file may be hardlinked from the artifact store or another
+        # output directory; patch a private copy so they are not touched.
+        if path.stat().st_nlink > 1:
+            private = path.with_name(name + PART_SUFFIX)
+            shutil.copyfile(path, private)
+            os.replace(private, path)
+        os.truncate(path, entry['size'])
+
+        chunk_size = entry['chunks']['chunk_size']
+        hashes = entry['chunks']['hashes']
+        runs = []
+        for index in bad_chunks:
+            if runs and runs[-1][1] == index:
+                runs[-1][1] = index + 1
+            else:
+                runs.append([index, index + 1])
+        fetched = 0
+        with open(path, 'r+b') as f:
+            for first, last in runs:
+                start, end = first * chunk_size, min(last * chunk_size, entry['size'])
+                for url in urls:
+                    try:
+                        self._fetch_chunks(url, f, start, end, chunk_size, hashes)
+                        fetched += end - start
+                        break
+                    except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError) as e:
+                        self._print(f"  ⚠ {name}: bytes {start}-{end - 1} from {urlsplit(url).netloc} failed: {e}")
+                else:
+                    self._print(f"  ✗ {name}: could not repair bytes {start}-{end - 1}")
+                    return None
+        return fetched
+
+    def _fetch_chunks(self, url, f, start, end, chunk_size, hashes):
+        """Fetch bytes ``start``..``end`` of ``url`` and write each verified chunk into ``f``."""
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT, "Range": f"bytes={start}-{end - 1}"})
+        with self.http.urlopen(request) as response:
+            if response.status != 206 or not self._content_range_matches(response, start):
+                raise ValueError("server did not honour the byte range")
+            offset = start
+            while offset < end:
+                length = min(chunk_size, end - offset)
+                data = b''
+                while len(data) < length:
+                    more = response.read(length - len(data))
+                    if not more:
+                        raise IOError(f"short read at byte {offset + len(data)}")
+                    data += more
+                digest = hashlib.sha256(data).hexdigest()
+                if digest != hashes[offset // chunk_size]:
+                    raise ValueError(f"chunk at byte {offset} does not match the manifest")
+                f.seek(offset)
+                f.write(data)
+                offset += length
+
+    def prune(self, keep=1):
+        """Delete superseded versions, keeping the newest ``keep`` of each artifact.
+
+        Files are grouped by package, architecture and release series (so
+        Cassandra 4.1 and 5.0 are kept independently) using their file
+        names. Anything resolved in this run is always kept, and files the
+        downloader does not recognise are never touched. Returns the
+        ``(name, size)`` of every removed file.
+        """
+        groups = {}
+        for file in self.download_dir.iterdir():
+            identity = artifact_identity(file.name) if file.is_file() else None
+            if identity:
+                key = (identity['package'], identity.get('arch'), identity.get('series'))
+                groups.setdefault(key, []).append((artifact_version_key(file.name, identity['version']), file))
+
+        removed = []
+        for versions in groups.values():
+            versions.sort(key=lambda entry: entry[0], reverse=True)
+            for _, file in versions[keep:]:
+                if file.name in self.resolved:
+                    continue
+                size = file.stat().st_size
+                file.unlink()
+                removed.append((file.name, size))
+                print(f"  🗑 Pruned superseded {file.name} ({format_size(size)})")
+        return removed
+
+    def print_sync_summary(self, manifest):
+        """Print what changed between the previous manifest and ``manifest``."""
+        previous = self.previous_manifest
+        current = {entry['name']: entry for entry in manifest['files']}
+        added = [current[n] for n in current if n not in previous]
+        changed = [current[n] for n in current
+                   if n in previous and previous[n].get('sha256') != current[n].get('sha256')]
+        removed = [previous[n] for n in previous if n not in current]
+
+        total = lambda entries: format_size(sum(entry.get('size') or 0 for entry in entries))
+        print("\n=== Sync Summary ===")
+        print(f"  + {len(added)} added ({total(added)})")
+        print(f"  ~ {len(changed)} changed ({total(changed)})")
+        print(f"  - {len(removed)} removed ({total(removed)})")
+        print(f"  = {len(self.unchanged)} unchanged, skipped")
+        for sign, entries in (('+', added), ('~', changed), ('-', removed)):
+            for entry in sorted(entries, key=lambda e: e['name']):
+                print(f"    {sign} {entry['name']}")
+
+    def serve(self, address, background=False):
+        """Publish the download directory as an apt/yum/file mirror until interrupted.
+
+        Repository indexes are generated from manifest.json (see MirrorIndex)
+        and regenerated when it changes, so a later run of this script into
+        the same directory is picked up without restarting the server. With
+        ``background`` the server runs on a daemon thread and is returned
+        instead.
+        """
+        index = MirrorIndex(self.download_dir, self.state_dir)
+        index.refresh()
+        server = MirrorServer(address, index)
+        port = server.server_address[1]
+        print(f"\nServing {self.download_dir} on http://{address[0]}:{port}/")
+        print(f"  apt: deb [trusted=yes] http://<this-host>:{port}/apt ./")
+        print(f"  yum: baseurl=http://<this-host>:{port}/yum  gpgcheck=0")
+        print(f"  files: http://<this-host>:{port}/<file name>")
+        if background:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            return server
+        print("Press Ctrl+C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nMirror stopped")
+        finally:
+            server.server_close()
+
+def queue_selected(downloader, args, package_filter, platforms, java_arches):
+    """Resolve and queue whatever the command line selected, prompting if nothing was."""
+    if args.from_lock:
+        # Everything was resolved when the lock was written.
+        downloader.download_from_lock(args.from_lock)
+    elif args.all:
+        # Resolve every upstream version in one concurrent pass first.
+        downloader.discover(cassandra=True, elasticsearch=True, java_arches=java_arches)
+        # Download everything. Honour --package-type when given so
+        # `--all --package-type rpm` mirrors only RPMs; default is both.
+        if args.package_type:
+            downloader.download_axonops(args.package_type, package_filter)
+        else:
+            downloader.download_axonops("deb", package_filter)
+            downloader.download_axonops("rpm", package_filter)
+        downloader.download_cassandra(non_interactive=True)
+        downloader.download_elasticsearch(non_interactive=True, platforms=platforms)
+        downloader.download_java(java_arches)
+    elif args.components:
+        downloader.discover(
+            cassandra='cassandra' in args.components and not args.version,
+            elasticsearch='elasticsearch' in args.components and not args.version,
+            java_arches=java_arches if 'java' in args.components else [])
+        # Download specified components
+        for component in args.components:
+            if component == 'axonops':
+                downloader.download_axonops(args.package_type, package_filter)
+            elif component == 'cassandra':
+                downloader.download_cassandra(args.version, non_interactive=args.non_interactive)
+            elif component == 'elasticsearch':
+                downloader.download_elasticsearch(args.version, non_interactive=args.non_interactive,
+                                                  platforms=platforms)
+            elif component == 'java':
+                downloader.download_java(java_arches)
+    elif args.axonops or args.cassandra or args.elasticsearch or args.java:
+        downloader.discover(cassandra=args.cassandra and not args.version,
+                            elasticsearch=args.elasticsearch and not args.version,
+                            java_arches=java_arches if args.java else [])
+        # Legacy argument support
+        if args.axonops:
+            downloader.download_axonops(args.package_type, package_filter)
+        if args.cassandra:
+            downloader.download_cassandra(args.version, non_interactive=args.non_interactive)
+        if args.elasticsearch:
+            downloader.download_elasticsearch(args.version, non_interactive=args.non_interactive,
+                                              platforms=platforms)
+        if args.java:
+            downloader.download_java(java_arches)
+    else:
+        # Interactive mode
+        print("\nWhat would you like to download?")
+        print("  1. AxonOps packages")
+        print("  2. Apache Cassandra")
+        print("  3. Elasticsearch")
+        print("  4. Java (Azul JDK)")
+        print("  5. All of the above")
+
+        choice = input("\nSelect components (comma-separated, e.g., 1,2,3): ").strip()
+        choices = [c.strip() for c in choice.split(',')]
+
+        if '5' in choices or not choices:
+            choices = ['1', '2', '3', '4']
+
+        if '4' in choices:
+            # Ask for architecture up front so its lookup joins discovery
+            print("\nSelect Java architecture:")
+            print("  1. x64 (Intel/AMD)")
+            print("  2. aarch64 (ARM64)")
+            arch_choice = input("Architecture (default: 1): ").strip() or "1"
+            arch = "aarch64" if arch_choice == "2" else "x64"
+
+        downloader.discover(cassandra='2' in choices, elasticsearch='3' in choices,
+                            java_arches=[arch] if '4' in choices else [])
+
+        if '1' in choices:
+            downloader.download_axonops()
+        if '2' in choices:
+            downloader.download_cassandra()
+        if '3' in choices:
+            downloader.download_elasticsearch()
+        if '4' in choices:
+            downloader.download_java([arch])
+
+
+# --watch polls the selected upstreams every --interval seconds. Each cycle is
+# a --sync run, so an unchanged repository costs only conditional metadata
+# requests. After a failed cycle the delay doubles, up to WATCH_MAX_BACKOFF
+# times the interval, and it resets after the next clean cycle.
+DEFAULT_WATCH_INTERVAL = 300  # seconds
+WATCH_MAX_BACKOFF = 12
+
+
+def watch(new_downloader, queue, interval=DEFAULT_WATCH_INTERVAL, keep=None, listen=None):
+    """Keep the download directory current until interrupted.
+
+    Every cycle builds a fresh downloader with ``new_downloader()``, lets
+    ``queue(downloader)`` resolve and queue the selected components, and
+    fetches whatever is new; the manifest is only rewritten when something
+    changed. ``keep`` prunes superseded versions after each cycle, and
+    ``listen`` serves the directory as a LAN mirror the whole time, so new
+    versions show up there as soon as they are fetched.
+    """
+    server = None
+    delay = interval
+    cycle = 0
+    try:
+        while True:
+            cycle += 1
+            downloader = new_downloader()
+            downloader.sync = True
+            downloader.revalidate_versions = True
+            print(f"\n=== Watch cycle {cycle} ({utc_now()}) ===")
+            try:
+                queue(downloader)
+                downloader.run_downloads()
+                removed = downloader.prune(keep) if keep else []
+                if downloader.results or removed or not (downloader.download_dir / "manifest.json").exists():
+                    downloader.print_sync_summary(downloader.create_manifest())
+                else:
+                    print(f"  = Nothing new upstream ({len(downloader.unchanged)} file(s) current)")
+                downloader.digest_index.save()
+                downloader.wait_for_refreshes()
+                failed = sum(1 for _, error in downloader.results if error is not None)
+            except Exception as e:
+                print(f"  ✗ Watch cycle failed: {e}")
+                failed = 1
+            finally:
+                downloader.http.close()
+            if listen and server is None and (downloader.download_dir / "manifest.json").exists():
+                server = downloader.serve(listen, background=True)
+
+            delay = min(delay * 2, interval * WATCH_MAX_BACKOFF) if failed else interval
+            if failed:
+                print(f"  ⚠ {failed} failure(s); backing off, next check in {delay:.0f}s")
+            else:
+                print(f"  Next check in {delay:.0f}s")
+            # A little jitter keeps several watchers from polling in lockstep.
+            time.sleep(delay * random.uniform(0.9, 1.1))
+    except KeyboardInterrupt:
+        print("\nWatch stopped")
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+
 
 def main():
     parser = argparse.ArgumentParser(description="Download offline packages for AxonOps Chef cookbook")
@@ -807,8 +3664,70 @@ def main():
     parser.add_argument("--version", help="Specific version to download (for Cassandra/Elasticsearch)")
     parser.add_argument("--output-dir", default=DOWNLOAD_DIR, help="Output directory")
     parser.add_argument("--java-arch", choices=["x64", "aarch64"], default="x64", help="Java architecture (default: x64)")
+    parser.add_argument("--platforms", metavar="LIST",
+                        help="Comma-separated platform matrix for Elasticsearch and Java, e.g. "
+                        f"linux-x86_64,linux-aarch64 (choices: {', '.join(PLATFORMS)}); overrides --java-arch")
     parser.add_argument("--components", nargs="+", choices=["java", "cassandra", "elasticsearch", "axonops"], help="Components to download")
     parser.add_argument("--non-interactive", action="store_true", help="Run in non-interactive mode")
+    parser.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS, metavar="N",
+                        help="Number of files to download in parallel (default: %(default)s)")
+    parser.add_argument("--stale-while-revalidate", action="store_true",
+                        help="Use expired cached versions immediately and refresh them in the background")
+    parser.add_argument("--store", metavar="DIR", default=os.environ.get("AXONOPS_ARTIFACT_STORE"),
+                        help="Content-addressed artifact store shared between output directories; "
+                        "files are hardlinked from it instead of downloaded again "
+                        "(default: $AXONOPS_ARTIFACT_STORE, disabled if unset)")
+    parser.add_argument("--buffer-size", type=parse_size, default=DEFAULT_BUFFER_SIZE, metavar="SIZE",
+                        help="Read/hash buffer size, e.g. 256K or 4M (default: 1M)")
+    parser.add_argument("--sync", action="store_true",
+                        help="Only fetch artifacts that are new or changed since the previous "
+                        "manifest.json, and print what changed")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete superseded versions of downloaded artifacts (see --keep)")
+    parser.add_argument("--keep", type=int, default=1, metavar="N",
+                        help="With --prune, versions to keep per package, architecture and "
+                        "release series (default: 1)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Serve the output directory as an apt/yum/file mirror over HTTP "
+                        "(after downloading, if any components were selected)")
+    parser.add_argument("--listen", type=parse_listen_address, default=DEFAULT_SERVE_ADDRESS,
+                        metavar="[HOST:]PORT", help=f"Address for --serve (default: {DEFAULT_SERVE_ADDRESS})")
+    parser.add_argument("--bundle", metavar="FILE",
+                        help="Pack every file in manifest.json into one indexed archive FILE for "
+                        "air-gapped transfer (after downloading, if any components were selected)")
+    parser.add_argument("--unbundle", metavar="FILE",
+                        help="Extract and verify the files of a --bundle archive into --output-dir")
+    parser.add_argument("--only", metavar="NAMES",
+                        help="With --unbundle, comma-separated file names (globs allowed) to extract")
+    parser.add_argument("--verify", action="store_true",
+                        help="Re-hash every file in manifest.json chunk by chunk and report damage")
+    parser.add_argument("--repair", action="store_true",
+                        help="Like --verify, then re-fetch only the damaged byte ranges")
+    parser.add_argument("--repair-from", metavar="URL",
+                        help="Base URL to repair from before the original upstream, "
+                        "e.g. a --serve mirror at http://mirror:8080/")
+    parser.add_argument("--write-lock", metavar="FILE",
+                        help="Record every resolved artifact (URL, size, version, sha256) in lock FILE")
+    parser.add_argument("--from-lock", metavar="FILE",
+                        help="Download exactly the artifacts pinned in lock FILE, skipping all "
+                        "version discovery and repository metadata")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and fetch new versions of the selected components as soon "
+                        "as they appear upstream (combine with --serve to keep a LAN mirror warm)")
+    parser.add_argument("--interval", type=int, default=DEFAULT_WATCH_INTERVAL, metavar="SECONDS",
+                        help="With --watch, seconds between upstream checks (default: %(default)s)")
+    parser.add_argument("--mirrors", metavar="FILE", default=os.environ.get("AXONOPS_MIRRORS"),
+                        help="JSON file of mirror base URLs for cassandra/elasticsearch; the fastest "
+                        "is used and checksums still come from the canonical upstream "
+                        "(default: $AXONOPS_MIRRORS, else dlcdn.apache.org for Cassandra)")
+    parser.add_argument("--metrics-json", metavar="FILE",
+                        help="Write per-artifact transfer metrics (time to first byte, throughput, "
+                        "retries, resumed bytes, verification time) to FILE")
+    parser.add_argument("--limit-rate", type=parse_size, metavar="RATE",
+                        help="Cap total download bandwidth in bytes/second, e.g. 500K or 20M (default: unlimited)")
+    parser.add_argument("--host-limit", action="append", default=[], metavar="HOST=N",
+                        help="Run at most N transfers against HOST at once; repeatable "
+                        "(defaults: packages.axonops.com=4, archive.apache.org=2, artifacts.elastic.co=3)")
 
     args = parser.parse_args()
 
@@ -825,81 +3744,148 @@ def main():
             else:
                 package_filter.append((entry, None))
 
-    downloader = PackageDownloader(args.output_dir)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.buffer_size < 4096:
+        parser.error("--buffer-size must be at least 4K")
+    if args.keep < 1:
+        parser.error("--keep must be at least 1")
+    if args.only and not args.unbundle:
+        parser.error("--only requires --unbundle")
+    if args.repair_from and not args.repair:
+        parser.error("--repair-from requires --repair")
+    if args.watch:
+        if not (args.all or args.components or args.axonops or args.cassandra or args.elasticsearch
+                or args.java or args.from_lock):
+            parser.error("--watch needs something to watch: --all, --components, a component or --from-lock")
+        if args.bundle or args.unbundle or args.verify or args.repair or args.write_lock or args.metrics_json:
+            parser.error("--watch cannot be combined with one-shot options "
+                         "(--bundle, --unbundle, --verify, --repair, --write-lock, --metrics-json)")
+        if args.interval < 10:
+            parser.error("--interval must be at least 10 seconds")
+        # Nobody is there to answer prompts.
+        args.non_interactive = True
+    if args.from_lock and (args.all or args.components or args.axonops or args.cassandra
+                           or args.elasticsearch or args.java):
+        parser.error("--from-lock replaces component selection; drop --all/--components/--<component>")
+
+    # One platform matrix drives both Elasticsearch and Java; without
+    # --platforms, Java follows --java-arch as before.
+    platforms = None
+    java_arches = [args.java_arch]
+    if args.platforms:
+        platforms = []
+        for platform in (p.strip() for p in args.platforms.split(',')):
+            if platform not in PLATFORMS:
+                parser.error(f"unknown platform {platform!r} (choices: {', '.join(PLATFORMS)})")
+            if platform not in platforms:
+                platforms.append(platform)
+        java_arches = list(dict.fromkeys(
+            PLATFORMS[p]['java_arch'] for p in platforms if PLATFORMS[p]['java_arch']))
+    if args.limit_rate is not None and args.limit_rate < 1024:
+        parser.error("--limit-rate must be at least 1K")
+
+    host_limits = {}
+    for entry in args.host_limit:
+        host, _, limit = entry.partition('=')
+        if not host.strip() or not limit.strip().isdigit() or int(limit) < 1:
+            parser.error(f"--host-limit expects HOST=N with N >= 1, got {entry!r}")
+        host_limits[host.strip().lower()] = int(limit)
+
+    mirrors = None
+    if args.mirrors:
+        try:
+            mirrors = load_mirror_config(args.mirrors)
+        except ValueError as e:
+            parser.error(f"--mirrors: {e}")
+
+    def new_downloader():
+        downloader = PackageDownloader(args.output_dir, jobs=args.jobs, buffer_size=args.buffer_size,
+                                       store_dir=args.store, limit_rate=args.limit_rate,
+                                       host_limits=host_limits, mirrors=mirrors)
+        downloader.stale_while_revalidate = args.stale_while_revalidate
+        downloader.sync = args.sync
+        return downloader
+
+    downloader = new_downloader()
 
     print("AxonOps Chef Cookbook Offline Package Downloader")
     print("=" * 50)
     print(f"Download directory: {downloader.download_dir}")
 
     try:
-        if args.all:
-            # Download everything. Honour --package-type when given so
-            # `--all --package-type rpm` mirrors only RPMs; default is both.
-            if args.package_type:
-                downloader.download_axonops(args.package_type, package_filter)
-            else:
-                downloader.download_axonops("deb", package_filter)
-                downloader.download_axonops("rpm", package_filter)
-            downloader.download_cassandra(non_interactive=True)
-            downloader.download_elasticsearch(non_interactive=True)
-            downloader.download_java(args.java_arch)
-        elif args.components:
-            # Download specified components
-            for component in args.components:
-                if component == 'axonops':
-                    downloader.download_axonops(args.package_type, package_filter)
-                elif component == 'cassandra':
-                    downloader.download_cassandra(args.version, non_interactive=args.non_interactive)
-                elif component == 'elasticsearch':
-                    downloader.download_elasticsearch(args.version, non_interactive=args.non_interactive)
-                elif component == 'java':
-                    downloader.download_java(args.java_arch)
-        elif args.axonops or args.cassandra or args.elasticsearch or args.java:
-            # Legacy argument support
-            if args.axonops:
-                downloader.download_axonops(args.package_type, package_filter)
-            if args.cassandra:
-                downloader.download_cassandra(args.version, non_interactive=args.non_interactive)
-            if args.elasticsearch:
-                downloader.download_elasticsearch(args.version, non_interactive=args.non_interactive)
-            if args.java:
-                downloader.download_java(args.java_arch)
-        else:
-            # Interactive mode
-            print("\nWhat would you like to download?")
-            print("  1. AxonOps packages")
-            print("  2. Apache Cassandra")
-            print("  3. Elasticsearch")
-            print("  4. Java (Azul JDK)")
-            print("  5. All of the above")
-
-            choice = input("\nSelect components (comma-separated, e.g., 1,2,3): ").strip()
-            choices = [c.strip() for c in choice.split(',')]
-
-            if '5' in choices or not choices:
-                choices = ['1', '2', '3', '4']
-
-            if '1' in choices:
-                downloader.download_axonops()
-            if '2' in choices:
-                downloader.download_cassandra()
-            if '3' in choices:
-                downloader.download_elasticsearch()
-            if '4' in choices:
-                # Ask for architecture
-                print("\nSelect Java architecture:")
-                print("  1. x64 (Intel/AMD)")
-                print("  2. aarch64 (ARM64)")
-                arch_choice = input("Architecture (default: 1): ").strip() or "1"
-                arch = "aarch64" if arch_choice == "2" else "x64"
-                downloader.download_java(arch)
+        if args.unbundle:
+            only = [name.strip() for name in args.only.split(',') if name.strip()] if args.only else None
+            failures = downloader.unbundle(args.unbundle, only)
+            if failures:
+                print(f"\n❌ {failures} file(s) failed verification")
+                sys.exit(1)
+            print("\n✅ Extraction complete!")
+            return
+
+        if args.watch:
+            watch(new_downloader,
+                  lambda d: queue_selected(d, args, package_filter, platforms, java_arches),
+                  args.interval, keep=args.keep if args.prune else None,
+                  listen=args.listen if args.serve else None)
+            return
+
+        verify = args.verify or args.repair
+        selected = (args.all or args.components or args.axonops or args.cassandra or args.elasticsearch
+                    or args.java or args.from_lock)
+        if (args.serve or args.bundle or verify) and not selected:
+            # Verify, serve or bundle what is already downloaded; never fall
+            # into the menu.
+            if verify:
+                damaged = downloader.verify(repair=args.repair, repair_from=args.repair_from)
+                downloader.http.close()
+                if damaged:
+                    print(f"\n❌ {damaged} file(s) damaged; see above")
+                    sys.exit(1)
+            if not (downloader.download_dir / "manifest.json").exists():
+                downloader.create_manifest()
+                downloader.digest_index.save()
+            if args.bundle:
+                downloader.bundle(args.bundle)
+            if args.serve:
+                downloader.serve(args.listen)
+            return
+
+        queue_selected(downloader, args, package_filter, platforms, java_arches)
+
+        # Everything above only resolved and queued the files; fetch them now.
+        downloader.run_downloads()
+        if args.prune:
+            print("\n=== Pruning superseded versions ===")
+            downloader.prune(args.keep)
 
         # Create manifest
-        downloader.create_manifest()
+        manifest = downloader.create_manifest()
+        if args.sync:
+            downloader.print_sync_summary(manifest)
+        downloader.digest_index.save()
+        damaged = downloader.verify(repair=args.repair, repair_from=args.repair_from) if verify else 0
+        if args.write_lock:
+            downloader.write_lock(args.write_lock)
+        downloader.wait_for_refreshes()
+        downloader.http.close()
+        if args.metrics_json:
+            downloader.write_metrics(args.metrics_json)
+
+        failures = downloader.print_summary() + damaged
+        if failures:
+            print(f"\n❌ {failures} download(s) failed; see the summary above")
+            sys.exit(1)
 
         print("\n✅ Download complete!")
         print(f"All packages downloaded to: {downloader.download_dir}")
 
+        if args.bundle:
+            downloader.bundle(args.bundle, manifest)
+
+        if args.serve:
+            downloader.serve(args.listen)
+
     except KeyboardInterrupt:
         print("\n\n⚠️  Download interrupted by user")
         sys.exit(1)